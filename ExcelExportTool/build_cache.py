@@ -0,0 +1,145 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 导表缓存：记录每个数据源文件的内容哈希、表头和生成的文件，内容没有变化的文件直接跳过读取和导出
+# 先比较文件大小和修改时间，只有两者之一变化时才计算哈希；导表工具的代码或导表选项变化时缓存全部失效
+# 跳过的文件上次生成的文件仍然算作本次生成的文件，不会被清理
+# 同时记录每张数据表由哪些数据源文件生成，拆分表的分表列表变化时即使剩下的分表内容没变也重新导出
+# 生成的文件也记录大小、修改时间和哈希，被--no-cache或中途失败的导表改写过时不再跳过
+
+import os
+import json
+import glob
+import hashlib
+
+from input_cache import file_hash
+
+CACHE_FILE_NAME = "build_cache.json"
+TOOL_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+# 导表工具的版本：所有代码文件内容的哈希，修改了生成逻辑或c#模板后旧的缓存不再使用
+def get_tool_version():
+    sha1 = hashlib.sha1()
+    for file_path in sorted(glob.glob(os.path.join(TOOL_FOLDER, "*.py"))):
+        with open(file_path, 'rb') as file:
+            sha1.update(os.path.basename(file_path).encode('utf-8'))
+            sha1.update(file.read())
+    return sha1.hexdigest()
+
+
+# 影响生成结果的选项：工具版本、读取方式和输出目录
+def get_options_key(context):
+    options = [get_tool_version(), context.engine, context.streaming,
+               [os.path.abspath(output_folder) for output_folder in context.output_folders]]
+    return hashlib.sha1(json.dumps(options).encode('utf-8')).hexdigest()
+
+
+# 表头中有json无法保存的值（例如日期）时不缓存表头，这个文件每次都重新读取
+def is_json_value(value):
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+class BuildCache:
+    # use_cache为False（--no-cache）时不跳过任何文件，但仍然记录本次导出的结果
+    def __init__(self, state_folder, options_key, use_cache=True):
+        self.cache_path = os.path.join(state_folder, CACHE_FILE_NAME)
+        self.options_key = options_key
+        self.use_cache = use_cache
+        self.sources = {}
+        # {数据表sheet名: [生成这张表的数据源key, ...]}，拆分表为按编号排列的所有分表
+        self.tables = {}
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, 'r', encoding='utf-8') as file:
+                cache = json.load(file)
+            if cache.get("options") == options_key:
+                self.sources = cache.get("sources", {})
+                self.tables = cache.get("tables", {})
+        # 本次检查过的文件的(大小, 修改时间, 哈希)和表头，导出后写入缓存
+        self.fingerprints = {}
+        self.headers = {}
+        # 本次内容没有变化、跳过导出的文件
+        self.unchanged_keys = set()
+
+    # 文件内容和上次导出时相同、且上次生成的文件都还是当时的内容时返回True
+    def is_unchanged(self, source_key, excel_file):
+        stat = os.stat(excel_file)
+        entry = self.sources.get(source_key)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            self.fingerprints[source_key] = (stat.st_size, stat.st_mtime_ns, entry["hash"])
+        else:
+            self.fingerprints[source_key] = (stat.st_size, stat.st_mtime_ns, file_hash(excel_file))
+        if not self.use_cache or entry is None or entry["hash"] != self.fingerprints[source_key][2] or entry.get("headers") is None:
+            return False
+        if not self.__is_same_outputs(entry):
+            return False
+        self.unchanged_keys.add(source_key)
+        self.headers[source_key] = entry["headers"]
+        # 只是修改时间变了，更新记录，下次不用再计算哈希
+        entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime_ns
+        return True
+
+    # 和输入目录镜像一样先比较大小和修改时间，只有修改时间变了才计算哈希
+    @staticmethod
+    def __is_same_outputs(entry):
+        output_stats = entry.get("output_stats")
+        if output_stats is None:
+            return False
+        for output, (size, mtime, content_hash) in output_stats.items():
+            try:
+                stat = os.stat(output)
+            except OSError:
+                return False
+            if stat.st_size != size:
+                return False
+            if stat.st_mtime_ns != mtime:
+                if file_hash(output) != content_hash:
+                    return False
+                output_stats[output] = [size, stat.st_mtime_ns, content_hash]
+        return True
+
+    # 返回[(sheet名, 表头), ...]
+    def get_headers(self, source_key):
+        return self.headers[source_key]
+
+    def set_headers(self, source_key, headers):
+        self.headers[source_key] = headers
+
+    def get_result(self, source_key):
+        entry = self.sources[source_key]
+        return list(entry["sheets"]), list(entry["outputs"])
+
+    def record(self, source_key, sheet_names, outputs):
+        size, mtime, content_hash = self.fingerprints[source_key]
+        headers = self.headers[source_key]
+        if not all(is_json_value(value) for sheet_name, header_rows in headers for row in header_rows for value in row):
+            headers = None
+        output_stats = {}
+        for output in sorted(set(outputs)):
+            try:
+                stat = os.stat(output)
+            except OSError:
+                # 生成的文件已经不在了，不记录，下次重新导出
+                self.sources.pop(source_key, None)
+                return
+            output_stats[output] = [stat.st_size, stat.st_mtime_ns, file_hash(output)]
+        self.sources[source_key] = {"size": size, "mtime": mtime, "hash": content_hash, "headers": headers,
+                                    "sheets": list(sheet_names), "outputs": sorted(output_stats), "output_stats": output_stats}
+
+    # 数据表上次由同样的数据源文件生成时返回True；删除或新增了分表时，其他分表的内容虽然没变，合并后的表也要重新导出
+    def is_same_table(self, sheet_name, source_keys):
+        return self.tables.get(sheet_name) == list(source_keys)
+
+    def record_table(self, sheet_name, source_keys):
+        self.tables[sheet_name] = list(source_keys)
+
+    # 完整导表时去掉已经不存在的文件
+    def keep_only(self, source_keys):
+        self.sources = {source_key: entry for source_key, entry in self.sources.items() if source_key in source_keys}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, 'w', encoding='utf-8') as file:
+            json.dump({"options": self.options_key, "sources": self.sources, "tables": self.tables}, file, ensure_ascii=False)
@@ -0,0 +1,88 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 一次导表的上下文：输出目录、导表选项、本次生成的文件和每个文件的耗时记录
+# 导表流程中的状态都放在这里传递，不使用模块级全局变量，同一进程中可以先后进行多次导表
+# 子进程使用create_worker_context()得到的新上下文，结果返回后由主进程按文件顺序合并
+
+import os
+
+
+class BuildContext:
+    # output_folders为(工程json目录, 客户端json目录, c#脚本目录, 枚举脚本目录)，memory_budget的单位为MB
+    # coordinator不为None时作为多机导表的协调节点监听这个地址，local_workers为在本机启动的工作节点数
+    # use_cache为False时不使用导表缓存，重新导出所有文件
+    def __init__(self, output_folders, streaming=False, engine="openpyxl", jobs=1, state_folder=None, memory_budget=None,
+                 coordinator=None, local_workers=0, use_cache=True):
+        self.output_folders = tuple(output_folders)
+        self.project_folder, self.client_folder, self.csfile_folder, self.enum_folder = self.output_folders
+        self.streaming = streaming
+        self.engine = engine
+        self.jobs = jobs
+        self.state_folder = state_folder
+        self.memory_budget = memory_budget
+        self.coordinator = coordinator
+        self.local_workers = local_workers
+        self.use_cache = use_cache
+        # 按生成顺序记录的绝对路径
+        self.created_files = []
+        # 内容有变化、实际写入了的文件，内容相同没有改写的文件不在其中
+        self.changed_files = []
+        # {数据源key: (文件大小, 预估耗时, 实际耗时)}
+        self.timings = {}
+        # {数据源key: 子进程实测的内存峰值}
+        self.peak_memories = {}
+        # 不为None时由export_pipeline.FileWriter异步写文件
+        self.writer = None
+        # {数据源文件绝对路径: 内容哈希}，检查导表缓存时计算，读取表格缓存时直接使用
+        self.content_hashes = {}
+        # 表格缓存的读取代码版本和c#生成代码的版本，第一次用到时计算，之后整次导表（包括子进程）直接使用
+        self.reader_version = None
+        self.generator_version = None
+
+    @property
+    def json_folders(self):
+        return self.project_folder, self.client_folder
+
+    # 选项相同、没有任何生成记录的新上下文，可以传给子进程
+    # 子进程中jobs默认为1，大表逐行转换，避免每个子进程再创建jobs个进程，进程数和内存超出预算
+    # 在主进程中导出有大表的文件时传入jobs，大表分块交给主进程的进程池
+    def create_worker_context(self, jobs=1):
+        worker_context = BuildContext(self.output_folders, self.streaming, self.engine, jobs, self.state_folder, self.memory_budget,
+                                      self.coordinator, self.local_workers, self.use_cache)
+        worker_context.content_hashes = self.content_hashes
+        worker_context.reader_version = self.reader_version
+        worker_context.generator_version = self.generator_version
+        return worker_context
+
+    # 清理旧文件时只删除输出目录中的文件，更换输出目录后上次记录的其他目录中的文件不受影响
+    def is_output_file(self, file_path):
+        for output_folder in self.output_folders:
+            output_folder = os.path.abspath(output_folder)
+            try:
+                if os.path.commonpath([output_folder, file_path]) == output_folder:
+                    return True
+            except ValueError:
+                # Windows上不在同一个盘符
+                continue
+        return False
+
+    def add_created_file(self, file_path):
+        self.created_files.append(os.path.abspath(file_path))
+
+    # 合并子进程生成的文件，只在主进程中调用
+    def merge_worker_result(self, outputs, changed_files):
+        self.created_files.extend(outputs)
+        self.changed_files.extend(changed_files)
+
+    def record_timing(self, source_key, file_size, predicted, actual, peak_memory=None):
+        self.timings[source_key] = (file_size, predicted, actual)
+        if peak_memory is not None:
+            self.peak_memories[source_key] = peak_memory
+
+    # 输出攒着的"成功生成文件"日志
+    def flush_write_log(self):
+        if self.writer is not None:
+            self.writer.flush_log()
@@ -0,0 +1,78 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 导表耗时记录：记录每个文件上次的导出耗时，用来预估本次耗时，并行导表时先开始耗时最长的文件
+# 每次导表的预估耗时和实际耗时也会记录下来，便于观察预估是否准确
+# 多进程导表时还会记录子进程实测的内存峰值，用于内存预算
+
+import os
+import json
+import time
+
+HISTORY_FILE_NAME = "build_history.json"
+# 没有任何历史记录时按文件大小预估的耗时（秒/MB）
+DEFAULT_SECONDS_PER_MB = 1.0
+# 新的实际耗时在预估中所占的权重
+DURATION_SMOOTHING = 0.5
+MAX_RUN_RECORDS = 20
+
+
+class BuildHistory:
+    def __init__(self, state_folder):
+        self.history_path = os.path.join(state_folder, HISTORY_FILE_NAME)
+        self.workbooks = {}
+        self.runs = []
+        if os.path.exists(self.history_path):
+            with open(self.history_path, 'r', encoding='utf-8') as file:
+                history = json.load(file)
+            self.workbooks = history.get("workbooks", {})
+            self.runs = history.get("runs", [])
+
+    def __seconds_per_byte(self):
+        total_size = sum(entry["size"] for entry in self.workbooks.values())
+        total_duration = sum(entry["duration"] for entry in self.workbooks.values())
+        if total_size == 0 or total_duration == 0:
+            return DEFAULT_SECONDS_PER_MB / (1024 * 1024)
+        return total_duration / total_size
+
+    # 有历史记录时按上次耗时预估（文件大小变化时按比例缩放），否则按文件大小预估
+    def estimate(self, source_key, file_size):
+        entry = self.workbooks.get(source_key)
+        if entry is None or entry["size"] == 0:
+            return file_size * self.__seconds_per_byte()
+        return entry["duration"] * file_size / entry["size"]
+
+    # 有实测的内存峰值时按峰值预估（文件大小变化时按比例缩放），否则返回default
+    def estimate_memory(self, source_key, file_size, default):
+        entry = self.workbooks.get(source_key)
+        if entry is None or "memory" not in entry or entry["size"] == 0:
+            return default
+        return int(entry["memory"] * file_size / entry["size"])
+
+    # timings为{数据源key: (文件大小, 预估耗时, 实际耗时)}
+    # peak_memories为{数据源key: 子进程实测的内存峰值}，只记录测到了峰值的文件
+    def record_run(self, timings, elapsed_time, peak_memories=None):
+        for source_key, (file_size, predicted, actual) in timings.items():
+            entry = self.workbooks.get(source_key)
+            duration = actual if entry is None else entry["duration"] * (1 - DURATION_SMOOTHING) + actual * DURATION_SMOOTHING
+            new_entry = {"size": file_size, "duration": round(duration, 4)}
+            peak_memory = (peak_memories or {}).get(source_key)
+            if peak_memory is not None:
+                new_entry["memory"] = peak_memory
+            elif entry is not None and "memory" in entry:
+                new_entry["memory"] = entry["memory"]
+            self.workbooks[source_key] = new_entry
+        self.runs.append({
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed": round(elapsed_time, 4),
+            "timings": {source_key: {"predicted": round(predicted, 4), "actual": round(actual, 4)}
+                        for source_key, (file_size, predicted, actual) in timings.items()},
+        })
+        self.runs = self.runs[-MAX_RUN_RECORDS:]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+        with open(self.history_path, 'w', encoding='utf-8') as file:
+            json.dump({"workbooks": self.workbooks, "runs": self.runs}, file, ensure_ascii=False, indent=4)
@@ -0,0 +1,45 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 导表记录：每个数据源文件导出的数据表sheet名和生成的文件列表
+# 导表后用上次记录的生成文件减去本次生成的文件得到需要清理的旧文件，不需要遍历输出目录
+
+import os
+import json
+
+MANIFEST_FILE_NAME = "build_manifest.json"
+
+
+class BuildManifest:
+    def __init__(self, state_folder):
+        self.manifest_path = os.path.join(state_folder, MANIFEST_FILE_NAME)
+        self.exists = os.path.exists(self.manifest_path)
+        self.sources = {}
+        if self.exists:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                self.sources = json.load(file).get("sources", {})
+
+    # 数据源以相对Excel目录的路径作为key，使用本地缓存目录时也能对应上
+    @staticmethod
+    def get_source_key(file_path, source_folder):
+        return os.path.relpath(os.path.abspath(file_path), os.path.abspath(source_folder)).replace('\\', '/')
+
+    def get_outputs(self, source_key):
+        return self.sources.get(source_key, {}).get("outputs", [])
+
+    def get_all_outputs(self):
+        return set(output for entry in self.sources.values() for output in entry["outputs"])
+
+    def get_sheet_map(self, exclude_keys=()):
+        return {key: entry["sheets"] for key, entry in self.sources.items() if key not in exclude_keys}
+
+    def record(self, source_key, sheet_names, outputs):
+        self.sources[source_key] = {"sheets": list(sheet_names), "outputs": sorted(set(outputs))}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with open(self.manifest_path, 'w', encoding='utf-8') as file:
+            json.dump({"sources": self.sources}, file, ensure_ascii=False, indent=4)
+        self.exists = True
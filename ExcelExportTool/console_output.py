@@ -0,0 +1,21 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# ANSI escape sequences for colors
+GREEN = '\033[92m'
+RED = '\033[91m'
+RESET = '\033[0m'
+YELLOW = '\033[93m'
+
+SEPARATOR = "——————————————————————————————————————————————————"
+
+def print_red(text):
+    print(f"{RED}{text}{RESET}")
+
+def print_green(text):
+    print(f"{GREEN}{text}{RESET}")
+
+def print_yellow(text):
+    print(f"{YELLOW}{text}{RESET}")
@@ -4,6 +4,7 @@
 # All rights reserved
 
 import os
+from export_pipeline import write_file
 
 def get_formatted_summary_string(origin_str):
     return f"/// <summary> {origin_str} </summary>"
@@ -12,15 +13,16 @@ auto_generated_summary_string = get_formatted_summary_string("This is auto-gener
 
 enum_namespace = "ConfigDataName"
 
-def generate_enum_file_from_sheet(sheet, enum_tag, output_folder):
+def generate_enum_file_from_sheet(context, sheet, enum_tag):
     enum_type_name = sheet.title.replace(enum_tag, "")
-    enum_rows = sheet.iter_rows(min_row=2)
+    enum_rows = sheet.iter_rows(min_row=2, values_only=True)
+    # 枚举名为空的行（例如整列设置了格式的空行）不导出
     enum_names, enum_values, remarks = zip(
-        *[(row[0].value, row[1].value, row[2].value) for row in enum_rows])
-    generate_enum_file(enum_type_name, enum_names, enum_values, remarks, enum_namespace, output_folder)
+        *[(row[0], row[1], row[2]) for row in enum_rows if row and row[0] is not None])
+    generate_enum_file(context, enum_type_name, enum_names, enum_values, remarks, enum_namespace, context.enum_folder)
 
 
-def generate_enum_file(enum_type_name, enum_names, enum_values, remarks, name_space, output_folder):
+def generate_enum_file(context, enum_type_name, enum_names, enum_values, remarks, name_space, output_folder, on_written=None):
     file_content = f"namespace {name_space}\n{{\n\t{auto_generated_summary_string}\n\tpublic enum {enum_type_name}\n\t{{\n"
 
     for i, key in enumerate(enum_names):
@@ -31,7 +33,7 @@ def generate_enum_file(enum_type_name, enum_names, enum_values, remarks, name_sp
     file_content += "\t}\n}"
 
     cs_file_path = os.path.join(output_folder, f"{enum_type_name}.cs")
-    write_to_file(file_content, cs_file_path)
+    write_to_file(context, file_content, cs_file_path, on_written)
 
 
 USING_NAMESPACE_STR = "\n".join([
@@ -66,7 +68,8 @@ def wrap_class_str(class_name, class_content_str, interface_name="", indent_leve
     return f"public class {class_name}{interface_part}\n{{\n{indented_content}\n}}"
 
 
-def generate_script_file(sheet_name, properties_dict, property_remarks, output_folder, need_generate_keys=False, file_suffix="Data"):
+def generate_script_file(context, sheet_name, properties_dict, property_remarks, output_folder, need_generate_keys=False, file_suffix="Data",
+                         on_written=None):
     # 通用文件生成流程
     info_class = f"{auto_generated_summary_string}\n{generate_info_class(sheet_name, properties_dict, property_remarks)}"
     data_class = f"{CONFIG_DATA_ATTRIBUTE_STR}\n{generate_data_class(sheet_name, need_generate_keys)}"
@@ -74,7 +77,7 @@ def generate_script_file(sheet_name, properties_dict, property_remarks, output_f
     final_file_content = USING_NAMESPACE_STR + NAMESPACE_WRAPPER_STR.format(add_indentation(file_content))
 
     cs_file_path = os.path.join(output_folder, f"{sheet_name}{file_suffix}.cs")
-    write_to_file(final_file_content, cs_file_path)
+    write_to_file(context, final_file_content, cs_file_path, on_written)
 
 
 def generate_info_class(class_name, properties_dict, property_remarks):
@@ -133,16 +136,30 @@ def generate_data_class(sheet_name, need_generate_keys):
                           f"{data_property}\n\n{init_method}\n\n{get_method}\n\n{get_method_with_key}{select_value_collection_method}\n\n{get_info_collection_method}")
 
 
-created_files = []
-
-def write_to_file(content, file_path):
+# 生成的文件记录到context中；context.writer不为None时交给它异步写入
+# on_written不为None时在文件写入成功后调用
+def write_to_file(context, content, file_path, on_written=None):
+    if context.writer is not None:
+        context.writer.submit(content, os.path.abspath(file_path), on_written)
+        context.writer.log(f"成功生成文件: {file_path}")
+        context.add_created_file(file_path)
+        return
     try:
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(content)
+        if write_file(content, file_path):
+            context.changed_files.append(os.path.abspath(file_path))
+        if on_written is not None:
+            on_written()
         print(f"成功生成文件: {file_path}")
-        created_files.append(os.path.abspath(file_path))  # 使用绝对路径
+        context.add_created_file(file_path)  # 使用绝对路径
     except Exception as e:
         print(f"写入文件失败: {file_path}, 错误: {e}")
 
-def get_create_files():
-    return created_files
+
+# 表结构没有变化、不需要重新生成的文件，仍然算作本次生成的文件，不会被清理
+def keep_unchanged_file(context, file_path):
+    line = f"表结构没有变化，保留文件: {file_path}"
+    if context.writer is not None:
+        context.writer.log(line)
+    else:
+        print(line)
+    context.add_created_file(file_path)
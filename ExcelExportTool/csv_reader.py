@@ -0,0 +1,73 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# csv/tsv数据源，格式与Excel的主sheet相同（前6行为备注、字段说明、类型、标签、字段名、默认值）
+# 对外提供和openpyxl相同的最小接口：workbook.worksheets、worksheet.title、worksheet.iter_rows(values_only=True)
+# 单元格保持原始文本，空单元格为None，类型转换交给convert_to_type
+# 只有bool列中的TRUE/FALSE等文本读取时转为布尔值，否则bool("FALSE")为True；Excel中的布尔单元格本身就是布尔值，不受影响
+
+import os
+import csv
+
+CSV_EXTENSIONS = ('.csv', '.tsv')
+# 与excel_processing中的表头格式一致（excel_processing导入了本模块，这里不能反过来导入）
+TYPE_ROW = 3
+HEADER_ROW_COUNT = 6
+BOOL_TEXTS = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def is_csv_file(file_path):
+    return str(file_path).lower().endswith(CSV_EXTENSIONS)
+
+
+class CsvWorkbook:
+    def __init__(self, file_path):
+        self.file_path = str(file_path)
+        # 文件名（不含扩展名）作为sheet名，一个文件只有一个sheet
+        title = os.path.splitext(os.path.basename(self.file_path))[0]
+        self.worksheets = [CsvWorksheet(self, title)]
+
+    @property
+    def sheetnames(self):
+        return [sheet.title for sheet in self.worksheets]
+
+    def close(self):
+        pass
+
+
+class CsvWorksheet:
+    def __init__(self, workbook, title):
+        self.parent = workbook
+        self.title = title
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        delimiter = '\t' if self.parent.file_path.lower().endswith('.tsv') else ','
+        # utf-8-sig兼容Excel另存为csv时写入的BOM
+        with open(self.parent.file_path, newline='', encoding='utf-8-sig') as file:
+            bool_columns = []
+            for row_index, row in enumerate(csv.reader(file, delimiter=delimiter), start=1):
+                if max_row is not None and row_index > max_row:
+                    break
+                if row_index == TYPE_ROW:
+                    bool_columns = [index for index, value in enumerate(row) if value.strip() == 'bool']
+                elif row_index > HEADER_ROW_COUNT:
+                    row = parse_bool_texts(row, bool_columns)
+                if row_index < min_row:
+                    continue
+                if max_col is not None:
+                    row = row[:max_col] + [''] * (max_col - len(row))
+                yield tuple(value if value != '' else None for value in row)
+
+
+# 无法识别的文本保持原样，和Excel中的文本单元格一样交给convert_to_type
+def parse_bool_texts(row, bool_columns):
+    for index in bool_columns:
+        if index < len(row) and row[index].strip().lower() in BOOL_TEXTS:
+            row[index] = BOOL_TEXTS[row[index].strip().lower()]
+    return row
+
+
+def load_workbook(file_path):
+    return CsvWorkbook(file_path)
@@ -24,6 +24,13 @@ def available_csharp_enum_name(name):
     return re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name)
 
 
+# 检查类型字符串是否能被convert_to_type处理
+def is_supported_type(type_str):
+    if not isinstance(type_str, str):
+        return False
+    return type_str in PRIMITIVE_TYPE_MAPPING or any(prefix in type_str for prefix in COMPLEX_TYPE_PREFIXES)
+
+
 def convert_to_type(type_str, value):
     # 处理基本类型转换
     if type_str in PRIMITIVE_TYPE_MAPPING:
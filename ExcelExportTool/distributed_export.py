@@ -0,0 +1,324 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 多机导表：协调节点发现需要导出的文件，通过TCP或Unix socket把文件分发给工作节点，收集生成的文件后统一写入和清理
+# 工作节点可以在其他机器上运行，不需要访问Excel目录和输出目录：文件内容随任务发送，生成的文件内容随结果返回
+# 协议：每条消息是4字节大端长度加utf-8编码的json
+#   工作节点 -> 协调节点：{"type": "ready", "token": 令牌}，令牌不一致时协调节点断开连接
+#   协调节点 -> 工作节点：{"type": "job", ...} 或 {"type": "done"}
+#   工作节点 -> 协调节点：{"type": "result", "index": 文件序号, "files": [[输出目录序号, 相对路径, 内容], ...], ...}
+# 工作节点启动方式：python distributed_export.py 协调节点地址，地址为host:port或unix:路径
+# 令牌通过环境变量EXCEL_EXPORT_TOKEN设置，协调节点和工作节点必须一致；协调节点没有设置时随机生成，只有本机启动的工作节点能连接
+# 协调节点只接受它在同一个连接上分发的文件的结果，生成文件的路径必须位于输出目录之内
+
+import os
+import sys
+import json
+import time
+import hmac
+import base64
+import secrets
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import deque
+
+from build_context import BuildContext
+from parallel_export import export_workbook_task
+from console_output import print_red
+
+# 工作节点连接协调节点的最长等待时间（秒），协调节点可能晚于工作节点启动
+CONNECT_TIMEOUT = 30
+UNIX_PREFIX = "unix:"
+TOKEN_ENV = "EXCEL_EXPORT_TOKEN"
+# 握手消息的长度上限和等待时间（秒），没有通过验证的连接不能让协调节点分配大块内存或一直等待
+HANDSHAKE_MESSAGE_SIZE = 4096
+HANDSHAKE_TIMEOUT = 30
+# 任务和结果消息的长度上限
+MAX_MESSAGE_SIZE = 512 * 1024 * 1024
+
+
+def parse_address(address):
+    if address.startswith(UNIX_PREFIX):
+        return socket.AF_UNIX, address[len(UNIX_PREFIX):]
+    host, port = address.rsplit(':', 1)
+    return socket.AF_INET, (host, int(port))
+
+
+def format_address(family, address):
+    if family == socket.AF_UNIX:
+        return UNIX_PREFIX + address
+    return f"{address[0]}:{address[1]}"
+
+
+def send_message(sock, message):
+    data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data)
+
+
+def receive_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+# 连接断开或消息超过长度上限时返回None
+def receive_message(sock, max_size=MAX_MESSAGE_SIZE):
+    header = receive_exactly(sock, 4)
+    if header is None:
+        return None
+    size = struct.unpack('>I', header)[0]
+    if size > max_size:
+        return None
+    data = receive_exactly(sock, size)
+    if data is None:
+        return None
+    return json.loads(data.decode('utf-8'))
+
+
+# 工作节点返回的相对路径只能位于输出目录之内
+def is_safe_relative_path(relative_path):
+    normalized = os.path.normpath(relative_path)
+    return not os.path.isabs(normalized) and normalized != '..' and not normalized.startswith('..' + os.sep)
+
+
+# 检查工作节点返回的结果：必须是这个连接上分发的文件，输出目录序号和路径都要合法
+def is_valid_result(message, index, folder_count):
+    if not isinstance(message, dict) or message.get("type") != "result" or message.get("index") != index:
+        return False
+    if not isinstance(message.get("files"), list) or not isinstance(message.get("failed"), bool):
+        return False
+    if type(message.get("duration")) not in (int, float):
+        return False
+    for item in message["files"]:
+        if not isinstance(item, list) or len(item) != 3:
+            return False
+        folder_index, relative_path, content = item
+        if type(folder_index) is not int or not 0 <= folder_index < folder_count:
+            return False
+        if not isinstance(relative_path, str) or not isinstance(content, str) or not is_safe_relative_path(relative_path):
+            return False
+    return isinstance(message.get("log"), str)
+
+
+class Coordinator:
+    def __init__(self, context, workbook_tables, costs=None):
+        self.context = context
+        self.workbook_tables = workbook_tables
+        order = list(range(len(workbook_tables)))
+        if costs is not None:
+            order.sort(key=lambda index: costs[index], reverse=True)
+        self.pending = deque(order)
+        self.finished = {}
+        self.stopped = False
+        self.connection_count = 0
+        self.condition = threading.Condition()
+        self.token = os.environ.get(TOKEN_ENV)
+        if not self.token:
+            print(f"没有设置环境变量{TOKEN_ENV}，只有本机启动的工作节点可以连接")
+            self.token = secrets.token_hex(16)
+        family, address = parse_address(context.coordinator)
+        self.unix_path = address if family == socket.AF_UNIX else None
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(address)
+        self.server.listen()
+        # 端口为0时由系统分配，启动本地工作节点时需要实际的地址
+        self.address = format_address(family, self.server.getsockname())
+
+    def __next_job(self):
+        with self.condition:
+            if self.stopped or not self.pending:
+                return None
+            return self.pending.popleft()
+
+    def __create_job(self, index):
+        excel_file, filename, table_sheet_names = self.workbook_tables[index]
+        with open(excel_file, 'rb') as file:
+            data = base64.b64encode(file.read()).decode('ascii')
+        return {"type": "job", "index": index, "filename": filename, "sheets": table_sheet_names, "data": data,
+                "source_folder": os.path.dirname(excel_file), "output_folders": list(self.context.output_folders),
+                "streaming": self.context.streaming, "engine": self.context.engine}
+
+    # 工作节点先发送令牌，验证通过后才分发文件
+    def __authenticate(self, connection):
+        connection.settimeout(HANDSHAKE_TIMEOUT)
+        message = receive_message(connection, HANDSHAKE_MESSAGE_SIZE)
+        connection.settimeout(None)
+        if not isinstance(message, dict) or message.get("type") != "ready" or not isinstance(message.get("token"), str):
+            return False
+        return hmac.compare_digest(message["token"].encode('utf-8'), self.token.encode('utf-8'))
+
+    def __serve(self, connection):
+        index = None
+        try:
+            if not self.__authenticate(connection):
+                print_red("拒绝了一个没有通过令牌验证的工作节点连接")
+                return
+            while True:
+                index = self.__next_job()
+                if index is None:
+                    send_message(connection, {"type": "done"})
+                    break
+                send_message(connection, self.__create_job(index))
+                message = receive_message(connection)
+                if message is None:
+                    break
+                if not is_valid_result(message, index, len(self.context.output_folders)):
+                    print_red("工作节点返回了非法的结果，断开连接")
+                    break
+                with self.condition:
+                    self.finished[index] = message
+                    self.condition.notify_all()
+                index = None
+        except (OSError, ValueError):
+            pass
+        finally:
+            connection.close()
+            with self.condition:
+                # 工作节点中途断开时，把它没有完成的文件交给其他工作节点
+                if index is not None and index not in self.finished:
+                    self.pending.appendleft(index)
+                self.connection_count -= 1
+                self.condition.notify_all()
+
+    def __accept_all(self):
+        while True:
+            try:
+                connection, address = self.server.accept()
+            except OSError:
+                return
+            with self.condition:
+                self.connection_count += 1
+            threading.Thread(target=self.__serve, args=(connection,), daemon=True).start()
+
+    def __store_outputs(self, result):
+        outputs = []
+        # 路径和输出目录序号在收到结果时已经检查过
+        for folder_index, relative_path, content in result["files"]:
+            file_path = os.path.abspath(os.path.join(self.context.output_folders[folder_index], relative_path))
+            self.context.writer.submit(content, file_path)
+            self.context.add_created_file(file_path)
+            outputs.append(file_path)
+        return outputs
+
+    # 返回与workbook_tables顺序一致的[(生成的文件列表, 耗时, 内存峰值), ...]
+    def run(self, local_workers=0):
+        print(f"协调节点监听地址:{self.address}，等待工作节点连接……")
+        threading.Thread(target=self.__accept_all, daemon=True).start()
+        worker_script = os.path.abspath(__file__)
+        # 令牌通过环境变量传给本机的工作节点，不出现在命令行中
+        env = dict(os.environ, **{TOKEN_ENV: self.token})
+        processes = [subprocess.Popen([sys.executable, worker_script, self.address], env=env) for _ in range(local_workers)]
+        results = []
+        try:
+            # 按文件顺序而不是完成顺序打印日志
+            for index in range(len(self.workbook_tables)):
+                with self.condition:
+                    while index not in self.finished:
+                        if processes and self.connection_count == 0 and all(process.poll() is not None for process in processes):
+                            print_red("所有本地工作节点都已退出，退出导表")
+                            sys.exit()
+                        self.condition.wait(timeout=1)
+                    result = self.finished[index]
+                print(result["log"], end='')
+                if result["failed"]:
+                    sys.exit()
+                results.append((self.__store_outputs(result), result["duration"], None))
+        finally:
+            with self.condition:
+                self.stopped = True
+            self.server.close()
+            if self.unix_path and os.path.exists(self.unix_path):
+                os.remove(self.unix_path)
+            for process in processes:
+                process.wait()
+        return results
+
+
+# 多机导表入口，与parallel_export.export_workbooks的返回值一致
+def export_workbooks_distributed(context, workbook_tables, costs=None):
+    return Coordinator(context, workbook_tables, costs).run(context.local_workers)
+
+
+# 在工作节点上导出一个文件：把文件内容写到临时目录，导出到临时输出目录，再把生成的文件内容带回
+def run_job(job, jobs):
+    with tempfile.TemporaryDirectory() as temp_folder:
+        source_folder = os.path.join(temp_folder, "source")
+        os.makedirs(source_folder)
+        excel_file = os.path.join(source_folder, job["filename"])
+        with open(excel_file, 'wb') as file:
+            file.write(base64.b64decode(job["data"]))
+        output_folders = [os.path.join(temp_folder, f"output{i}") for i in range(len(job["output_folders"]))]
+        for output_folder in output_folders:
+            os.makedirs(output_folder)
+        context = BuildContext(output_folders, job["streaming"], job["engine"], jobs)
+        outputs, changed_files, log, failed, duration, peak_memory = export_workbook_task(context, excel_file, job["filename"], job["sheets"])
+
+        files = []
+        for output in outputs:
+            for folder_index, output_folder in enumerate(output_folders):
+                relative_path = os.path.relpath(output, os.path.abspath(output_folder))
+                if is_safe_relative_path(relative_path):
+                    with open(output, 'r', encoding='utf-8') as file:
+                        files.append([folder_index, relative_path, file.read()])
+                    break
+        # 日志中的临时目录换成协调节点上的目录，和本机导表时的日志一致
+        for output_folder, target_folder in zip(output_folders, job["output_folders"]):
+            log = log.replace(output_folder, target_folder)
+        log = log.replace(source_folder, job["source_folder"])
+        return {"type": "result", "index": job["index"], "files": files, "log": log, "failed": failed, "duration": duration}
+
+
+def connect(address):
+    family, address = parse_address(address)
+    deadline = time.time() + CONNECT_TIMEOUT
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+            return sock
+        except OSError:
+            sock.close()
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+# 工作节点：连接协调节点，不断领取文件导出，直到协调节点没有新的文件
+def run_worker(address, token, jobs=1):
+    sock = connect(address)
+    try:
+        send_message(sock, {"type": "ready", "token": token})
+        while True:
+            job = receive_message(sock)
+            if job is None or job["type"] == "done":
+                return
+            send_message(sock, run_job(job, jobs))
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多机导表的工作节点")
+    parser.add_argument("coordinator", help="协调节点地址，host:port或unix:路径")
+    parser.add_argument("--jobs", type=int, default=1, help="行数很多的表按行分块转换时使用的进程数")
+    args = parser.parse_args()
+    token = os.environ.get(TOKEN_ENV)
+    if not token:
+        print_red(f"没有设置环境变量{TOKEN_ENV}，需要和协调节点使用相同的令牌")
+        sys.exit(1)
+    run_worker(args.coordinator, token, args.jobs)
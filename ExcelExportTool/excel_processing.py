@@ -5,9 +5,107 @@
 
 
 import sys
+from openpyxl.reader.excel import ExcelReader
+import xlsx_reader
+import csv_reader
 
-def read_cell_values(sheet, row_index):
-    return [cell.value for cell in sheet[row_index]]
+# 可选的读取引擎：openpyxl为默认引擎，native为只解析单元格值的轻量引擎
+ENGINES = ["openpyxl", "native"]
+
+ENUM_SHEET_TAG = "Enum-"
+
+# 可以导出的数据源文件类型
+SOURCE_EXTENSIONS = ('.xlsx',) + csv_reader.CSV_EXTENSIONS
+
+HEADER_ROW_COUNT = 6
+TYPE_ROW = 3
+FIELD_NAME_ROW = 5
+KEY_COLUMN = 2
+# 主键只能是int或者string（string主键会生成枚举）
+KEY_TYPES = ["int", "string"]
+
+
+# 导表只需要数据表sheet和Enum-开头的sheet，策划的草稿页、透视表等不需要解析
+def select_export_sheets(sheet_names, table_sheet_names):
+    return [name for name in sheet_names if name in table_sheet_names or name.startswith(ENUM_SHEET_TAG)]
+
+
+# 除第一个sheet以外，其他sheet只有符合6行表头格式时才作为数据表导出：
+# 第5行第2列有主键字段名，第3行第2列的主键类型为int或string
+def is_table_header(header_rows):
+    data_types = header_rows[TYPE_ROW - 1]
+    field_names = header_rows[FIELD_NAME_ROW - 1]
+    return (len(field_names) >= KEY_COLUMN and field_names[KEY_COLUMN - 1] is not None
+            and len(data_types) >= KEY_COLUMN and data_types[KEY_COLUMN - 1] in KEY_TYPES)
+
+
+# 只解析指定sheet的openpyxl读取器
+class SheetSelectiveReader(ExcelReader):
+    def __init__(self, file_path, sheet_names, **kwargs):
+        super().__init__(file_path, **kwargs)
+        self.sheet_names = set(sheet_names)
+
+    def read_worksheets(self):
+        sheets = self.parser.sheets
+        kept = [index for index, sheet in enumerate(sheets) if sheet.name in self.sheet_names]
+        # sheet级别的定义名称按下标绑定，需要跟着重新编号
+        index_mapping = {old_index: new_index for new_index, old_index in enumerate(kept)}
+        defined_names = self.parser.defined_names
+        defined_names.definedName = [defn for defn in defined_names.definedName
+                                     if defn.localSheetId is None or int(defn.localSheetId) in index_mapping]
+        for defn in defined_names.definedName:
+            if defn.localSheetId is not None:
+                defn.localSheetId = index_mapping[int(defn.localSheetId)]
+        self.parser.sheets = [sheets[index] for index in kept]
+        super().read_worksheets()
+
+
+def read_sheet_names(file_path):
+    if csv_reader.is_csv_file(file_path):
+        return csv_reader.load_workbook(file_path).sheetnames
+    return xlsx_reader.read_sheet_names(file_path)
+
+
+# streaming为True时以只读模式打开，单元格按需从xml中解析，不在内存中保留整张表
+# sheet_names不为None时只加载其中的sheet
+def load_workbook(file_path, streaming=False, engine="openpyxl", sheet_names=None):
+    # csv/tsv不区分读取引擎，本身就是逐行读取
+    if csv_reader.is_csv_file(file_path):
+        return csv_reader.load_workbook(file_path)
+    if sheet_names is None:
+        sheet_names = xlsx_reader.read_sheet_names(file_path)
+    if engine == "native":
+        return xlsx_reader.load_workbook(file_path, sheet_names)
+    reader = SheetSelectiveReader(str(file_path), sheet_names, read_only=streaming, data_only=True)
+    reader.read()
+    return reader.wb
+
+# 整列设置格式后max_row会变成1048576，这里找出真实的数据范围：
+# 第5行最后一个有字段名的列，以及导出列（第2列到最后一个字段列）中最后一个有值的行
+# 最后几行没有主键但有数据时也要读到，由调用方报错，不能直接丢弃
+# 只对完整加载的openpyxl工作表有效，流式读取的工作表返回(None, None)，由调用方逐行跳过空行
+def find_data_extent(worksheet):
+    cells = getattr(worksheet, "_cells", None)
+    if cells is None:
+        return None, None
+    max_col = 1
+    for (row, col), cell in cells.items():
+        if row == FIELD_NAME_ROW and col > max_col and cell.value is not None:
+            max_col = col
+    max_col = max(max_col, KEY_COLUMN)
+    max_row = HEADER_ROW_COUNT
+    for (row, col), cell in cells.items():
+        if row > max_row and KEY_COLUMN <= col <= max_col and cell.value is not None:
+            max_row = row
+    return max_row, max_col
+
+# 列范围以第5行最后一个非空字段名为准，整列设置了格式的空列不参与导出
+def get_column_count(field_names):
+    return max((index + 1 for index, name in enumerate(field_names) if name is not None), default=0)
+
+# 从行迭代器中读取下一行的值，行数不足时返回空列表
+def read_cell_values(rows):
+    return list(next(rows, ()))
 
 def check_repeating_values(values):
     if len(values) != len(set(values)):
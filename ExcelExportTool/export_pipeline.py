@@ -0,0 +1,175 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 导表流水线：读取文件 -> 类型转换和json序列化 -> 写文件
+# 读取下一个文件和写入生成的文件都在后台线程中进行，与当前文件的转换重叠
+# 各阶段之间是有界队列，队列满时上游等待，同时在内存中的文件和待写入内容数量有上限
+
+import os
+import sys
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from excel_processing import load_workbook, read_sheet_names, select_export_sheets
+from console_output import print_red
+
+# 预读取的文件数量，加上正在转换和正在读取的文件，内存中最多同时有PREFETCH_DEPTH+2个文件
+# 完整加载的openpyxl文件占用内存很多，这时不预读取，内存中只有正在导出的文件
+PREFETCH_DEPTH = 1
+# 同时进行中的写入数量上限
+MAX_PENDING_WRITES = 64
+# 执行阻塞写文件的线程数
+WRITER_THREADS = 4
+# 攒够多少行"成功生成文件"日志输出一次
+LOG_BATCH_SIZE = 32
+
+
+# 只打开需要导出的sheet，没有需要导出的sheet时返回None
+# table_cache不为None时优先从表格缓存读取，缓存中没有时读取文件并在导出过程中写入缓存
+def open_workbook(excel_file, table_sheet_names, streaming, engine, table_cache=None):
+    sheet_names = select_export_sheets(read_sheet_names(excel_file), table_sheet_names)
+    if not sheet_names:
+        return None
+    if table_cache is not None:
+        return table_cache.open_workbook(excel_file, sheet_names, lambda: load_workbook(excel_file, streaming, engine, sheet_names))
+    return load_workbook(excel_file, streaming, engine, sheet_names)
+
+
+# 读取时只保留单元格值或按需解析的文件（流式读取、native引擎）才值得预读取
+def is_prefetch_enabled(streaming, engine):
+    return streaming or engine != "openpyxl"
+
+
+# 在后台线程中按顺序读取文件，依次产出(excel_file, filename, table_sheet_names, workbook)
+# 读取出错时在取到该文件时抛出，和串行读取时一样
+def prefetch_workbooks(workbook_tables, streaming, engine, table_cache=None):
+    if not is_prefetch_enabled(streaming, engine):
+        for excel_file, filename, table_sheet_names in workbook_tables:
+            yield excel_file, filename, table_sheet_names, open_workbook(excel_file, table_sheet_names, streaming, engine, table_cache)
+        return
+    loaded = queue.Queue(maxsize=PREFETCH_DEPTH)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                loaded.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def load_all():
+        for excel_file, filename, table_sheet_names in workbook_tables:
+            try:
+                item = (open_workbook(excel_file, table_sheet_names, streaming, engine, table_cache), None)
+            except Exception as e:
+                item = (None, e)
+            if not put(item):
+                # 下游已经退出，丢弃刚读取的文件
+                if item[0] is not None:
+                    item[0].close()
+                return
+
+    loader = threading.Thread(target=load_all, daemon=True)
+    loader.start()
+    try:
+        for excel_file, filename, table_sheet_names in workbook_tables:
+            wb, error = loaded.get()
+            if error is not None:
+                raise error
+            yield excel_file, filename, table_sheet_names, wb
+    finally:
+        # 导表中途退出时停止读取，关闭已经读取但还没导出的文件
+        stopped.set()
+        loader.join()
+        while not loaded.empty():
+            wb, error = loaded.get()
+            if wb is not None:
+                wb.close()
+
+
+# 基于asyncio的写文件子系统：事件循环运行在后台线程中，阻塞的文件读写交给一个小线程池
+# with块内cs_generation.write_to_file只提交(路径, 内容)到context.writer，同时进行中的写入数量有上限，达到上限时提交方等待
+# "成功生成文件"日志攒够一批再一次性输出；退出with块时等待所有写入完成，有写入失败时汇总输出后退出导表
+# 内容有变化、实际写入的文件记录到context.changed_files
+class FileWriter:
+    def __init__(self, context):
+        self.context = context
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=WRITER_THREADS)
+        self.slots = threading.BoundedSemaphore(MAX_PENDING_WRITES)
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.log_lines = []
+        self.failures = []
+
+    def __enter__(self):
+        self.thread.start()
+        self.context.writer = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.writer = None
+        # 占满所有名额说明提交的写入都已完成
+        for _ in range(MAX_PENDING_WRITES):
+            self.slots.acquire()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.executor.shutdown()
+        self.flush_log()
+        if self.failures:
+            print_red(f"{len(self.failures)}个文件写入失败：")
+            for file_path, error in self.failures:
+                print_red(f"{file_path}, 错误: {error}")
+            # 已经因为其他错误退出时不覆盖原来的异常
+            if exc_type is None:
+                sys.exit()
+        return False
+
+    # on_written不为None时在文件写入成功后调用
+    def submit(self, content, file_path, on_written=None):
+        self.slots.acquire()
+        asyncio.run_coroutine_threadsafe(self.__write(content, file_path, on_written), self.loop)
+
+    async def __write(self, content, file_path, on_written):
+        try:
+            if await self.loop.run_in_executor(self.executor, write_file, content, file_path):
+                self.context.changed_files.append(file_path)
+            if on_written is not None:
+                on_written()
+        except Exception as e:
+            self.failures.append((file_path, e))
+        finally:
+            self.slots.release()
+
+    def log(self, line):
+        self.log_lines.append(line)
+        if len(self.log_lines) >= LOG_BATCH_SIZE:
+            self.flush_log()
+
+    def flush_log(self):
+        if self.log_lines:
+            print('\n'.join(self.log_lines))
+            self.log_lines = []
+
+
+# 内容和已有文件完全相同时不改写，保留原来的修改时间，Unity不会重新导入资源和编译脚本；返回是否写入了文件
+def write_file(content, file_path):
+    # 和文本模式写入一样转换换行符，与之前生成的文件逐字节比较
+    data = content.replace('\n', os.linesep).encode('utf-8')
+    try:
+        # 大小不同时不需要读取原文件
+        if os.path.getsize(file_path) == len(data):
+            with open(file_path, 'rb') as file:
+                if file.read() == data:
+                    return False
+    except OSError:
+        pass
+    with open(file_path, 'wb') as file:
+        file.write(data)
+    return True
@@ -0,0 +1,74 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 导表前的表头预检查：只读取sheet名称和前6行表头，在加载完整数据之前发现全局错误
+
+from excel_processing import load_workbook, read_sheet_names, read_cell_values, get_column_count, is_table_header
+from excel_processing import HEADER_ROW_COUNT, FIELD_NAME_ROW, ENUM_SHEET_TAG
+from data_processing import is_supported_type
+from split_table import is_same_split_table, check_split_headers
+
+
+# file_name为数据源key（相对Excel目录的路径），不同目录下的同名文件是不同的数据源
+class WorkbookHeader:
+    def __init__(self, file_name, sheet_name, header_rows):
+        self.file_name = file_name
+        self.sheet_name = sheet_name
+        self.header_rows = header_rows
+        self.remarks, self.headers, self.data_types, self.data_labels, self.field_names, self.default_values = header_rows
+
+
+def read_sheet_header(sheet):
+    rows = sheet.iter_rows(values_only=True)
+    header_rows = [read_cell_values(rows) for _ in range(HEADER_ROW_COUNT)]
+    rows.close()
+    column_count = get_column_count(header_rows[FIELD_NAME_ROW - 1])
+    return [list(row[:column_count]) + [None] * (column_count - len(row)) for row in header_rows]
+
+
+# 返回文件中所有数据表sheet的表头：第一个sheet总是数据表，其他非Enum-的sheet符合6行表头格式时才是数据表
+def read_workbook_headers(excel_file, file_name, engine="openpyxl"):
+    sheet_names = [name for index, name in enumerate(read_sheet_names(excel_file))
+                   if index == 0 or not name.startswith(ENUM_SHEET_TAG)]
+    # 以只读模式打开，读完表头后不再继续解析数据行
+    wb = load_workbook(excel_file, True, engine, sheet_names)
+    workbook_headers = []
+    for index, sheet in enumerate(wb.worksheets):
+        header_rows = read_sheet_header(sheet)
+        if index == 0 or is_table_header(header_rows):
+            workbook_headers.append(WorkbookHeader(file_name, sheet.title, header_rows))
+    wb.close()
+    return workbook_headers
+
+
+# 返回所有错误信息，以及文件名到数据表sheet名列表的映射
+# file_sheet_map为不在本次检查范围内、但已经导出过的文件和sheet名列表
+def check_workbook_headers(workbook_headers, file_sheet_map=None):
+    errors = []
+    file_sheet_map = dict(file_sheet_map or {})
+    split_headers = {}
+    for header in workbook_headers:
+        # 如果worksheet的名字已经出现过，则记录错误：与xx文件名的sheet重名
+        # 同一目录下同一张拆分表的分表（表名_编号）允许同名，但表头必须一致；不同目录下的分表分别导出，不能同名
+        for file_name, sheet_names in file_sheet_map.items():
+            if header.sheet_name in sheet_names and not is_same_split_table(header.file_name, file_name):
+                errors.append(f"[{header.file_name}]存在与[{file_name}]中相同名称的sheet[{header.sheet_name}]，无法重复生成")
+        file_sheet_map.setdefault(header.file_name, []).append(header.sheet_name)
+
+        first_header = split_headers.setdefault(header.sheet_name, header)
+        if first_header is not header and is_same_split_table(header.file_name, first_header.file_name):
+            for row in check_split_headers(header.header_rows, first_header.header_rows):
+                errors.append(f"[{header.file_name}]第{row}行表头与分表[{first_header.file_name}]不一致")
+
+        repeating_names = set([x for x in header.field_names if header.field_names.count(x) > 1])
+        if repeating_names:
+            errors.append(f"[{header.file_name}]发现重复的字段: {repeating_names}")
+
+        for index, data_type in enumerate(header.data_types):
+            label = header.data_labels[index] if index < len(header.data_labels) else None
+            if index > 0 and label != "ignore" and not is_supported_type(data_type):
+                field_name = header.field_names[index] if index < len(header.field_names) else None
+                errors.append(f"[{header.file_name}]字段{field_name}的类型{data_type}不支持")
+    return errors, file_sheet_map
@@ -0,0 +1,78 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 输入目录的本地镜像：Excel目录在网络共享盘上时，只把改动过的文件复制到本地缓存目录，之后从本地副本导表
+
+import os
+import shutil
+import hashlib
+
+from excel_processing import SOURCE_EXTENSIONS
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path):
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def is_source_file(filename):
+    # ~$开头的是Excel打开文件时生成的锁文件
+    return filename.lower().endswith(SOURCE_EXTENSIONS) and not filename.startswith('~$')
+
+
+def is_same_file(source_path, cache_path):
+    if not os.path.exists(cache_path):
+        return False
+    source_stat = os.stat(source_path)
+    cache_stat = os.stat(cache_path)
+    # 先比较大小和修改时间，只有大小相同而修改时间不同时才计算哈希
+    if source_stat.st_size != cache_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == cache_stat.st_mtime_ns:
+        return True
+    if file_hash(source_path) != file_hash(cache_path):
+        return False
+    # 内容没变，只同步修改时间，下次不用再计算哈希
+    os.utime(cache_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    return True
+
+
+# 返回(复制的文件数, 未改动的文件数, 删除的文件数)
+def mirror_source_folder(source_folder, cache_folder):
+    copied_count = 0
+    unchanged_count = 0
+    source_files = set()
+    for folder_name, subfolders, filenames in os.walk(source_folder):
+        relative_folder = os.path.relpath(folder_name, source_folder)
+        for filename in filenames:
+            if not is_source_file(filename):
+                continue
+            relative_path = os.path.normpath(os.path.join(relative_folder, filename))
+            source_files.add(relative_path)
+            source_path = os.path.join(folder_name, filename)
+            cache_path = os.path.join(cache_folder, relative_path)
+            if is_same_file(source_path, cache_path):
+                unchanged_count += 1
+                continue
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # copy2会保留修改时间，下次比较时大小和时间都相同就不需要再读取源文件
+            shutil.copy2(source_path, cache_path)
+            copied_count += 1
+
+    # 源目录中已经删除的文件，本地副本也要删除，否则会继续被导出
+    removed_count = 0
+    for folder_name, subfolders, filenames in os.walk(cache_folder):
+        for filename in filenames:
+            cache_path = os.path.join(folder_name, filename)
+            relative_path = os.path.normpath(os.path.relpath(cache_path, cache_folder))
+            if is_source_file(filename) and relative_path not in source_files:
+                os.remove(cache_path)
+                removed_count += 1
+    return copied_count, unchanged_count, removed_count
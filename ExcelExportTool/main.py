@@ -6,97 +6,364 @@
 import os
 import sys
 import time
-import openpyxl
-from cs_generation import generate_enum_file_from_sheet, get_create_files
-from worksheet_data import WorksheetData
+import shlex
+import argparse
+from excel_processing import ENGINES, SOURCE_EXTENSIONS
+from header_check import WorkbookHeader, read_workbook_headers, check_workbook_headers
+from input_cache import mirror_source_folder
+from build_manifest import BuildManifest
+from build_cache import BuildCache, get_options_key
+from table_cache import get_table_cache
+from schema_fingerprint import get_schema_fingerprints
+from split_table import group_split_tables, expand_split_parts
+from workbook_export import export_split_table
+from build_context import BuildContext
+from parallel_export import export_workbooks
+from distributed_export import export_workbooks_distributed
+from export_pipeline import FileWriter
+from build_history import BuildHistory
+from worker_pool import get_worker_pool, shutdown_worker_pool
+from memory_budget import estimate_workbook_memory
+from console_output import SEPARATOR, print_red, print_green, print_yellow
 
-# ANSI escape sequences for colors
-GREEN = '\033[92m'
-RED = '\033[91m'
-RESET = '\033[0m'
-YELLOW = '\033[93m'
+# 导表记录等状态文件的默认目录
+DEFAULT_STATE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".export_state")
 
-def print_red(text):
-    print(f"{RED}{text}{RESET}")
+# 查找目录下所有需要导出的Excel和csv/tsv文件（文件名首字母大写）
+def find_excel_files(source_folder):
+    excel_files = []
+    for folder_name, subfolders, filenames in os.walk(source_folder):
+        for filename in filenames:
+            if is_source_file_name(filename):
+                excel_files.append((os.path.join(folder_name, filename), filename))
+    return excel_files
+
+def is_source_file_name(filename):
+    return filename.lower().endswith(SOURCE_EXTENSIONS) and filename[0].isupper()
 
-def print_green(text):
-    print(f"{GREEN}{text}{RESET}")
+# 预检查：只读取sheet名称和表头，在生成任何文件之前发现sheet重名、字段重复和不支持的类型
+# cache不为None时，内容没有变化的文件从导表缓存中取表头，不再打开文件
+# 导表缓存失效（例如修改了导表选项）时从表格缓存中取上次检查的表头，计算过的内容哈希记录到context中
+# 返回的file_sheet_map以数据源key（相对Excel目录的路径）区分文件，不同目录下的同名文件互不影响
+def check_headers(context, excel_files, file_sheet_map, source_folder, cache=None):
+    print(f"开始检查{len(excel_files)}个Excel文件的表头……")
+    table_cache = get_table_cache(context)
+    workbook_headers = []
+    for excel_file, filename in excel_files:
+        source_key = BuildManifest.get_source_key(excel_file, source_folder)
+        if cache is None:
+            workbook_headers.extend(read_workbook_headers(excel_file, source_key, context.engine))
+            continue
+        is_unchanged = cache.is_unchanged(source_key, excel_file)
+        context.content_hashes[os.path.abspath(excel_file)] = cache.fingerprints[source_key][2]
+        if is_unchanged:
+            header_list = cache.get_headers(source_key)
+        else:
+            header_list = table_cache.load_headers(excel_file) if table_cache is not None else None
+            if header_list is None:
+                header_list = [(header.sheet_name, header.header_rows) for header in read_workbook_headers(excel_file, source_key, context.engine)]
+                if table_cache is not None:
+                    table_cache.save_headers(excel_file, header_list)
+            cache.set_headers(source_key, header_list)
+        headers = [WorkbookHeader(source_key, sheet_name, header_rows) for sheet_name, header_rows in header_list]
+        workbook_headers.extend(headers)
+    errors, file_sheet_map = check_workbook_headers(workbook_headers, file_sheet_map)
+    if errors:
+        for error in errors:
+            print_red(error)
+        print_red(f"表头检查发现{len(errors)}个错误，退出导表")
+        sys.exit()
+    return file_sheet_map
 
-def print_yellow(text):
-    print(f"{YELLOW}{text}{RESET}")
+# 内容没有变化、且其中每张数据表仍由同样的数据源文件生成的文件可以跳过导出
+# 拆分表的分表列表变化时（例如删除了一个分表），剩下的分表都要重新导出，否则合并后的表仍包含已删除分表的数据
+def get_skipped_keys(workbook_tables, split_tables, source_folder, cache):
+    if cache is None:
+        return set()
+    changed_keys = set()
+    for excel_file, filename, table_sheet_names in workbook_tables:
+        source_key = BuildManifest.get_source_key(excel_file, source_folder)
+        if source_key not in cache.unchanged_keys or not all(cache.is_same_table(sheet_name, [source_key]) for sheet_name in table_sheet_names):
+            changed_keys.add(source_key)
+    for sheet_name, parts in split_tables:
+        part_keys = [BuildManifest.get_source_key(excel_file, source_folder) for excel_file, filename in parts]
+        if not cache.is_same_table(sheet_name, part_keys):
+            changed_keys.update(part_keys)
+    return cache.unchanged_keys - changed_keys
 
-def batch_excel_to_json(source_folder):
+# 导出所有文件中的数据表，返回{数据源key: (导出的数据表sheet名列表, 生成的文件列表)}
+# context.jobs大于1时多个文件在子进程中并行导出，按历史耗时预估先导出耗时长的文件
+# context.memory_budget（MB）不为None时，同时导出的文件的预估内存峰值之和不超过预算
+# cache不为None时跳过内容没有变化的文件，它们上次生成的文件也算作本次生成的文件
+def export_excel_files(context, excel_files, file_sheet_map, source_folder, cache=None):
     start_time = time.time()
-    print(f"开始导表……")
-    print(f"Excel目录:{source_folder}")
+    workbook_tables, split_tables = group_split_tables(excel_files, file_sheet_map, source_folder)
+    skipped_keys = get_skipped_keys(workbook_tables, split_tables, source_folder, cache)
+    if skipped_keys:
+        print(f"{len(skipped_keys)}个文件没有变化，跳过导出")
+    created_count = len(context.created_files)
+    cached_count = 0
+    # 生成的文件异步写入，离开with块时全部写完，有写入失败时退出导表
+    with FileWriter(context):
+        all_workbook_tables, all_split_tables = workbook_tables, split_tables
+        workbook_tables = [(excel_file, filename, table_sheet_names) for excel_file, filename, table_sheet_names in workbook_tables
+                           if BuildManifest.get_source_key(excel_file, source_folder) not in skipped_keys]
+        # 拆分表的所有分表都没有变化时才跳过
+        split_tables = [(sheet_name, parts) for sheet_name, parts in split_tables
+                        if any(BuildManifest.get_source_key(excel_file, source_folder) not in skipped_keys for excel_file, filename in parts)]
+        history = BuildHistory(context.state_folder)
+        source_keys = [BuildManifest.get_source_key(excel_file, source_folder) for excel_file, filename, table_sheet_names in workbook_tables]
+        file_sizes = [os.path.getsize(excel_file) for excel_file, filename, table_sheet_names in workbook_tables]
+        costs = [history.estimate(source_key, file_size) for source_key, file_size in zip(source_keys, file_sizes)]
+        memory_estimates = None
+        if context.memory_budget is not None and context.jobs > 1:
+            memory_estimates = [history.estimate_memory(source_key, file_size,
+                                                        estimate_workbook_memory(excel_file, table_sheet_names, context.streaming, context.engine))
+                                for source_key, file_size, (excel_file, filename, table_sheet_names) in zip(source_keys, file_sizes, workbook_tables)]
+        if context.coordinator is not None:
+            workbook_results = export_workbooks_distributed(context, workbook_tables, costs)
+        else:
+            workbook_results = export_workbooks(context, workbook_tables, costs, memory_estimates)
+        for source_key, file_size, cost, (outputs, duration, peak_memory) in zip(source_keys, file_sizes, costs, workbook_results):
+            context.record_timing(source_key, file_size, cost, duration, peak_memory)
+        history.record_run(context.timings, time.time() - start_time, context.peak_memories)
+        history.save()
 
-    file_count = 0
-    file_sheet_map = {}
-    for folder_name, subfolders, filenames in os.walk(source_folder):
-        for filename in filenames:
-            if filename.endswith('.xlsx') and filename[0].isupper():
-                excel_file = os.path.join(folder_name, filename)
-                print("——————————————————————————————————————————————————")
-                print(f"即将开始处理文件{folder_name}\\{GREEN}{filename}{RESET}")
-                wb = openpyxl.load_workbook(str(excel_file), data_only=True)
-
-                # 如果worksheet的名字已经被导出过了（在file_sheet_map中），则中断导表并打印错误信息：与xx文件名的sheet重名
-                if wb.worksheets[0].title in file_sheet_map.values():
-                    # 获取已经导出且sheet名重复的文件名
-                    for key, value in file_sheet_map.items():
-                        if value == wb.worksheets[0].title:
-                            print_red(f"存在与[{key}]中相同名称的sheet[{wb.worksheets[0].title}]，无法重复生成，退出导表")
-                            sys.exit()
-
-                main_sheet_data = WorksheetData(wb.worksheets[0])
-                main_sheet_data.generate_json(output_project_folder)
-                main_sheet_data.generate_json(output_client_folder)
-                main_sheet_data.generate_script(csfile_output_folder)
-
-                if len(wb.worksheets) > 1:
-                    enum_tag = "Enum-"
-                    for sheet in wb.worksheets[1:]:
-                        if sheet.title.startswith(enum_tag):
-                            generate_enum_file_from_sheet(sheet, enum_tag, enum_output_folder)
-
-                file_count += 1
-                file_sheet_map[filename] = wb.worksheets[0].title
-
-    print("——————————————————————————————————————————————————")
-
-    print(f"准备清理目录其他非生成文件……")
-    # 遍历output_project_folder、output_client_folder、csfile_output_folder、enum_output_folder中的所有文件
-    # 如果文件不存在get_create_files中，则删除
-    created_files = get_create_files()
+        results = {BuildManifest.get_source_key(excel_file, source_folder): ([], []) for excel_file, filename in excel_files}
+        for source_key in skipped_keys:
+            results[source_key] = cache.get_result(source_key)
+            for output in results[source_key][1]:
+                context.add_created_file(output)
+            cached_count += len(results[source_key][1])
+        for source_key, (excel_file, filename, table_sheet_names), (outputs, duration, peak_memory) in zip(source_keys, workbook_tables, workbook_results):
+            sheet_names, source_outputs = results[source_key]
+            sheet_names.extend(table_sheet_names)
+            source_outputs.extend(outputs)
+        for sheet_name, parts in split_tables:
+            split_outputs = export_split_table(context, sheet_name, parts)
+            for excel_file, filename in parts:
+                sheet_names, outputs = results[BuildManifest.get_source_key(excel_file, source_folder)]
+                # 没有变化的分表的缓存结果中已经有这张拆分表
+                if sheet_name not in sheet_names:
+                    sheet_names.append(sheet_name)
+                outputs.extend(output for output in split_outputs if output not in outputs)
+
+    # 内容相同的文件没有改写，修改时间不变，Unity不会重新导入
+    generated_count = len(context.created_files) - created_count - cached_count
+    print(f"生成了{generated_count}个文件，其中{len(context.changed_files)}个文件内容有变化，"
+          f"{generated_count - len(context.changed_files)}个文件内容相同没有改写")
+
+    if cache is not None:
+        for source_key, (sheet_names, outputs) in results.items():
+            if source_key not in skipped_keys:
+                cache.record(source_key, sheet_names, outputs)
+        for excel_file, filename, table_sheet_names in all_workbook_tables:
+            for sheet_name in table_sheet_names:
+                cache.record_table(sheet_name, [BuildManifest.get_source_key(excel_file, source_folder)])
+        for sheet_name, parts in all_split_tables:
+            cache.record_table(sheet_name, [BuildManifest.get_source_key(excel_file, source_folder) for excel_file, filename in parts])
+        cache.save()
+    return results
+
+# 没有状态目录时返回None；关闭导表缓存时不跳过任何文件，但仍然记录结果，之后的导表不会信任被本次改写的旧记录
+def open_build_cache(context):
+    if context.state_folder is None:
+        return None
+    return BuildCache(context.state_folder, get_options_key(context), context.use_cache)
+
+# 输出目录中上次生成、这次没有再生成的文件，dry_run为True时只列出不删除，返回文件数
+def remove_stale_outputs(context, stale_files, dry_run=False):
     delete_count = 0
-    for folder in [output_project_folder, output_client_folder, csfile_output_folder, enum_output_folder]:
+    for file_path in sorted(stale_files):
+        if not context.is_output_file(file_path) or not os.path.exists(file_path):
+            continue
+        if dry_run:
+            print_yellow(f"将删除文件{file_path}")
+        else:
+            os.remove(file_path)
+            print_red(f"删除文件{file_path}")
+        delete_count += 1
+    return delete_count
+
+
+# 没有导表记录时遍历四个输出目录，删除不在本次生成的文件中的文件，.meta文件由Unity处理
+def clean_output_folders(context, dry_run=False):
+    created_files = set(context.created_files)
+    stale_files = []
+    for folder in context.output_folders:
         for folder_name, subfolders, filenames in os.walk(folder):
             for filename in filenames:
                 file_path = os.path.abspath(os.path.join(folder_name, filename))  # 使用绝对路径
                 meta_file_path = file_path + '.meta'
                 if file_path not in created_files and not file_path.endswith(
                         '.meta') and meta_file_path not in created_files:
-                    os.remove(file_path)
-                    print_red(f"删除文件{file_path}")
-                    delete_count += 1
+                    stale_files.append(file_path)
+    return remove_stale_outputs(context, stale_files, dry_run)
+
 
+def print_clean_result(delete_count, dry_run):
     if delete_count == 0:
         print("没有需要删除的文件")
+    elif dry_run:
+        print_yellow(f"有{delete_count}个文件需要删除，本次只列出没有删除")
     else:
         print(f"删除了{delete_count}个文件")
 
+
+# dry_run为True时只列出需要清理的旧文件，不删除
+def batch_excel_to_json(context, source_folder, input_cache_folder=None, dry_run=False):
+    start_time = time.time()
+    print(f"开始导表……")
+    print(f"Excel目录:{source_folder}")
+
+    # Excel目录在网络共享盘上时，先把改动过的文件同步到本地缓存目录，再从本地副本导表
+    if input_cache_folder:
+        copied_count, unchanged_count, removed_count = mirror_source_folder(source_folder, input_cache_folder)
+        print(f"同步到本地缓存目录:{input_cache_folder}，复制{copied_count}个文件，"
+              f"{unchanged_count}个文件未改动，删除{removed_count}个文件")
+        source_folder = input_cache_folder
+
+    excel_files = find_excel_files(source_folder)
+    cache = open_build_cache(context)
+    if cache is not None:
+        cache.keep_only(set(BuildManifest.get_source_key(excel_file, source_folder) for excel_file, filename in excel_files))
+    file_sheet_map = check_headers(context, excel_files, None, source_folder, cache)
+
+    manifest = BuildManifest(context.state_folder)
+    old_outputs = manifest.get_all_outputs()
+    manifest.sources = {}
+    results = export_excel_files(context, excel_files, file_sheet_map, source_folder, cache)
+    for source_key, (sheet_names, outputs) in results.items():
+        manifest.record(source_key, sheet_names, outputs)
+    file_count = len(excel_files)
+
+    print(SEPARATOR)
+
+    # 上次导表记录中有、本次没有再生成的文件就是需要清理的旧文件，耗时只和生成的文件数有关，与输出目录中的文件数无关
+    # 还没有导表记录时遍历输出目录，删除所有非生成文件（多进程导表时生成的文件由各子进程汇总而来）
+    if manifest.exists:
+        print(f"准备清理旧的生成文件……")
+        delete_count = remove_stale_outputs(context, old_outputs - set(context.created_files), dry_run)
+    else:
+        print(f"没有找到导表记录，准备清理目录其他非生成文件……")
+        delete_count = clean_output_folders(context, dry_run)
+    print_clean_result(delete_count, dry_run)
+
+    # 表格缓存只保留本次所有数据源文件的内容
+    table_cache = get_table_cache(context)
+    if table_cache is not None:
+        table_cache.prune(content_hash for size, mtime, content_hash in cache.fingerprints.values())
+    # 只保留本次生成的c#文件的表结构指纹
+    schema_fingerprints = get_schema_fingerprints(context)
+    if schema_fingerprints is not None:
+        schema_fingerprints.keep_only(context.created_files)
+
+    # 记录每个文件生成了哪些文件，之后按记录清理；只列出旧文件时不更新记录，下次导表时仍能找到它们
+    if not dry_run:
+        manifest.save()
+
     end_time = time.time()
     elapsed_time = end_time - start_time
-    print("——————————————————————————————————————————————————")
+    print(SEPARATOR)
     print_green(f"导表结束，成功处理了{file_count}个Excel文件，总耗时{elapsed_time:.2f}秒")
 
 
-# 获取命令行参数
-root_folder = sys.argv[1]
-output_project_folder = sys.argv[2]
-output_client_folder = sys.argv[3]
-csfile_output_folder = sys.argv[4]
-enum_output_folder = sys.argv[5]
+# 只导出指定的文件（例如拖拽到bat上的文件），不扫描整个目录
+# 只清理这些文件在上次导表记录中生成过、但这次没有再生成的文件
+def export_selected_files(context, source_folder, file_paths, dry_run=False):
+    start_time = time.time()
+    print(f"开始导出指定的{len(file_paths)}个文件……")
+
+    excel_files = []
+    for file_path in expand_split_parts(file_paths):
+        filename = os.path.basename(file_path)
+        if not os.path.isfile(file_path) or not is_source_file_name(filename):
+            print_yellow(f"跳过{file_path}：不是需要导出的Excel文件")
+            continue
+        excel_files.append((os.path.abspath(file_path), filename))
+
+    manifest = BuildManifest(context.state_folder)
+    if not manifest.exists:
+        print_yellow("没有找到导表记录，本次不清理旧文件，建议先完整导表一次")
+    source_keys = [BuildManifest.get_source_key(excel_file, source_folder) for excel_file, filename in excel_files]
+    # 与没有导出的其他文件之间的sheet重名也要检查
+    cache = open_build_cache(context)
+    file_sheet_map = check_headers(context, excel_files, manifest.get_sheet_map(source_keys), source_folder, cache)
+
+    results = export_excel_files(context, excel_files, file_sheet_map, source_folder, cache)
+    old_outputs = set(output for source_key in results for output in manifest.get_outputs(source_key))
+    delete_count = remove_stale_outputs(context, old_outputs - set(context.created_files), dry_run)
+    if not dry_run:
+        for source_key, (sheet_names, outputs) in results.items():
+            manifest.record(source_key, sheet_names, outputs)
+        manifest.save()
 
-# 调用函数进行转换
-batch_excel_to_json(root_folder)
+    elapsed_time = time.time() - start_time
+    print(SEPARATOR)
+    if delete_count > 0:
+        print_clean_result(delete_count, dry_run)
+    print_green(f"导表结束，成功处理了{len(excel_files)}个Excel文件，总耗时{elapsed_time:.2f}秒")
+
+
+# 每次导表使用新的BuildContext，file_paths不为空时只导出这些文件
+def run_build(args, output_folders, file_paths=None):
+    context = BuildContext(output_folders, args.streaming, args.engine, args.jobs, args.state_dir, args.memory_budget,
+                           args.coordinator, args.local_workers, not args.no_cache)
+    if file_paths:
+        export_selected_files(context, args.root_folder, file_paths, args.clean_dry_run)
+    else:
+        batch_excel_to_json(context, args.root_folder, args.input_cache, args.clean_dry_run)
+
+# 常驻模式：先按命令行参数导表一次，之后每读到一行输入导表一次，直到输入q或输入结束
+# 空行完整导表，否则把这一行当作要导出的文件路径列表；多次导表之间复用同一个子进程池
+def run_daemon(args, output_folders):
+    file_paths = args.files
+    while True:
+        try:
+            run_build(args, output_folders, file_paths)
+        except SystemExit:
+            print_red("本次导表失败，修改后可以重新导表")
+        try:
+            line = input("按回车重新导表，输入文件路径只导出这些文件，输入q退出：").strip()
+        except EOFError:
+            break
+        if line.lower() == "q":
+            break
+        file_paths = [path.strip('"') for path in shlex.split(line, posix=False)]
+    shutdown_worker_pool()
+
+
+if __name__ == "__main__":
+    # 获取命令行参数
+    parser = argparse.ArgumentParser(description="Excel导出json和c#脚本")
+    parser.add_argument("root_folder", help="Excel目录")
+    parser.add_argument("output_project_folder", help="工程json导出目录")
+    parser.add_argument("output_client_folder", help="客户端json导出目录")
+    parser.add_argument("csfile_output_folder", help="c#脚本导出目录")
+    parser.add_argument("enum_output_folder", help="枚举脚本导出目录")
+    parser.add_argument("--streaming", action="store_true", help="流式只读模式，适合行数很多的大表，不在内存中保留整张表")
+    parser.add_argument("--engine", choices=ENGINES, default="openpyxl", help="Excel读取引擎，native只解析单元格的值，读取大表更快")
+    parser.add_argument("--input-cache", help="本地缓存目录，Excel目录在网络共享盘上时先同步改动过的文件到这里再导表")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_FOLDER, help="导表记录等状态文件的目录")
+    parser.add_argument("--files", nargs="+", help="只导出指定的文件，不扫描整个Excel目录")
+    parser.add_argument("--jobs", type=int, default=1, help="并行导表的进程数，默认为1（串行）")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="并行导表时所有子进程的内存预算（MB），大文件会少并行几个")
+    parser.add_argument("--coordinator", metavar="ADDRESS",
+                        help="作为多机导表的协调节点监听这个地址（host:port或unix:路径），把文件分发给工作节点导出")
+    parser.add_argument("--local-workers", type=int, default=0, help="多机导表时在本机启动的工作节点数")
+    parser.add_argument("--no-cache", action="store_true", help="不使用导表缓存，重新导出所有文件")
+    parser.add_argument("--clean-dry-run", action="store_true", help="只列出需要清理的旧文件，不删除，也不更新导表记录")
+    parser.add_argument("--daemon", action="store_true", help="常驻模式：导表后等待输入，每输入一行重新导表一次，子进程池保持不退出")
+    args = parser.parse_args()
+
+    output_folders = (args.output_project_folder, args.output_client_folder, args.csfile_output_folder, args.enum_output_folder)
+
+    # 提前启动子进程池，子进程的启动和预导入与表头检查重叠
+    if args.jobs > 1:
+        get_worker_pool(args.jobs)
+
+    if args.daemon:
+        run_daemon(args, output_folders)
+    else:
+        run_build(args, output_folders, args.files)
@@ -0,0 +1,74 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 多进程导表的内存预算：预估每个文件导出时子进程的内存峰值，同时导出的文件预估占用之和不超过预算
+# 没有历史记录时按工作表尺寸（单元格数量）预估，读取不到尺寸时按压缩后的文件大小预估
+# 之后按子进程实测的内存峰值修正
+
+import os
+import sys
+
+from csv_reader import is_csv_file
+from excel_processing import select_export_sheets
+from xlsx_reader import read_sheet_dimensions
+
+try:
+    import resource
+except ImportError:
+    # Windows上没有resource模块，只按尺寸预估
+    resource = None
+
+# 子进程本身（python和openpyxl）的内存占用
+BASE_MEMORY = 40 * 1024 * 1024
+# 每个单元格的内存占用：openpyxl完整模式会创建Cell对象，流式和native引擎主要是转换后的行数据
+FULL_MODE_CELL_MEMORY = 750
+STREAMING_CELL_MEMORY = 350
+# 读取不到尺寸时，每字节压缩后文件大小对应的内存占用
+MEMORY_PER_FILE_BYTE = 60
+
+
+def get_cell_memory(streaming, engine):
+    if streaming or engine == "native":
+        return STREAMING_CELL_MEMORY
+    return FULL_MODE_CELL_MEMORY
+
+
+# 按需要导出的工作表的尺寸预估内存峰值（字节）
+def estimate_workbook_memory(excel_file, table_sheet_names, streaming, engine):
+    file_size = os.path.getsize(excel_file)
+    if is_csv_file(excel_file):
+        return BASE_MEMORY + file_size * MEMORY_PER_FILE_BYTE
+    try:
+        dimensions = read_sheet_dimensions(excel_file)
+    except Exception:
+        dimensions = {}
+    sheet_names = select_export_sheets(list(dimensions), table_sheet_names)
+    if not sheet_names:
+        return BASE_MEMORY + file_size * MEMORY_PER_FILE_BYTE
+    cell_count = sum(rows * columns for rows, columns in (dimensions[sheet_name] for sheet_name in sheet_names))
+    return BASE_MEMORY + cell_count * get_cell_memory(streaming, engine)
+
+
+# 当前进程到目前为止的内存峰值（字节），无法获取时返回None
+def get_peak_memory():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS上单位是字节，Linux上是KB
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# 从order中按顺序选出可以开始导出的文件：正在导出的文件数不超过jobs，预估占用之和不超过budget
+# 放不下的大文件先跳过，让后面的小文件补上空位；没有文件在导出时至少开始一个，避免超过预算的文件永远无法导出
+def admit_workbooks(order, estimates, running_memory, running_count, jobs, budget):
+    admitted = []
+    for index in order:
+        if running_count + len(admitted) >= jobs:
+            break
+        if budget is not None and (running_count or admitted) and running_memory + estimates[index] > budget:
+            continue
+        admitted.append(index)
+        running_memory += estimates[index]
+    return admitted
@@ -0,0 +1,129 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 多进程导表：每个文件的读取、类型转换、json和c#生成在子进程中完成
+# 子进程的输出先缓存起来，主进程按文件顺序打印，日志和串行导表时一致
+# 有超过分块行数的表的文件在主进程中导出，大表按行分块交给同一个进程池转换，不在子进程中再创建进程池
+
+import io
+import sys
+import time
+import traceback
+from contextlib import redirect_stdout
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from workbook_export import export_workbook, export_loaded_workbook
+from export_pipeline import FileWriter, prefetch_workbooks
+from memory_budget import get_peak_memory, admit_workbooks
+from worker_pool import get_worker_pool
+from table_cache import get_table_cache
+from csv_reader import is_csv_file
+from xlsx_reader import read_sheet_dimensions
+from excel_processing import HEADER_ROW_COUNT
+from worksheet_data import ROW_CHUNK_SIZE
+
+
+# 在子进程中执行，返回(生成的文件列表, 内容有变化的文件列表, 日志, 是否失败, 耗时, 内存峰值)
+# 内存峰值只在这个文件抬高了子进程的历史峰值时才能测出，否则为None
+# context为create_worker_context()得到的上下文；子进程中的大表直接逐行转换，不再创建嵌套的进程池
+# 有大表的文件也在主进程中通过这个函数导出，日志同样按文件顺序打印
+def export_workbook_task(context, excel_file, filename, table_sheet_names):
+    log = io.StringIO()
+    failed = False
+    outputs = []
+    start_time = time.perf_counter()
+    peak_before = get_peak_memory()
+    with redirect_stdout(log):
+        try:
+            with FileWriter(context):
+                outputs = export_workbook(context, excel_file, filename, table_sheet_names)
+        except SystemExit:
+            failed = True
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+            failed = True
+    peak_after = get_peak_memory()
+    peak_memory = peak_after if peak_after is not None and peak_after > peak_before else None
+    return outputs, context.changed_files, log.getvalue(), failed, time.perf_counter() - start_time, peak_memory
+
+
+# 按工作表尺寸判断文件中是否有需要分块转换的大表，csv和读取不到尺寸的文件按小表处理
+def has_chunked_sheet(excel_file, table_sheet_names):
+    if is_csv_file(excel_file):
+        return False
+    try:
+        dimensions = read_sheet_dimensions(excel_file)
+    except Exception:
+        return False
+    return any(dimensions[sheet_name][0] - HEADER_ROW_COUNT >= ROW_CHUNK_SIZE
+               for sheet_name in table_sheet_names if sheet_name in dimensions)
+
+
+# workbook_tables为[(excel_file, filename, [sheet_name, ...]), ...]
+# costs为每个文件的预估耗时，预估耗时长的文件先开始，避免最大的文件最后才开始
+# context.memory_budget不为None时，同时导出的文件的预估内存memory_estimates之和不超过预算
+# 子进程生成的文件按文件顺序合并到context中，返回与workbook_tables顺序一致的[(生成的文件列表, 耗时, 内存峰值), ...]
+def export_workbooks(context, workbook_tables, costs=None, memory_estimates=None):
+    jobs = context.jobs
+    # 只有一个文件时在主进程中导出，大表用已经预热的进程池分块转换
+    if jobs <= 1 or len(workbook_tables) <= 1:
+        # 串行导表时在后台线程中预读取下一个文件（完整加载openpyxl时除外），耗时包括等待读取的时间
+        results = []
+        start_time = time.perf_counter()
+        workbooks = prefetch_workbooks(workbook_tables, context.streaming, context.engine, get_table_cache(context))
+        for excel_file, filename, table_sheet_names, wb in workbooks:
+            outputs = export_loaded_workbook(context, wb, excel_file, filename, table_sheet_names)
+            end_time = time.perf_counter()
+            results.append((outputs, end_time - start_time, None))
+            start_time = end_time
+        return results
+
+    order = list(range(len(workbook_tables)))
+    if costs is not None:
+        order.sort(key=lambda index: costs[index], reverse=True)
+    memory_budget = None
+    if context.memory_budget is not None and memory_estimates is not None:
+        memory_budget = context.memory_budget * 1024 * 1024
+    if memory_estimates is None:
+        memory_estimates = [0] * len(workbook_tables)
+    # 有大表的文件依次在主进程中导出，同时其他文件在子进程中导出，大表的分块和它们共用进程池
+    local_order = [index for index in order if has_chunked_sheet(workbook_tables[index][0], workbook_tables[index][2])]
+    order = [index for index in order if index not in local_order]
+    finished = {}
+    next_index = 0
+    executor = get_worker_pool(jobs)
+    running = {}
+    while order or local_order or running:
+        running_memory = sum(memory_estimates[index] for index in running.values())
+        if local_order:
+            running_memory += memory_estimates[local_order[0]]
+        for index in admit_workbooks(order, memory_estimates, running_memory, len(running), jobs, memory_budget):
+            order.remove(index)
+            excel_file, filename, table_sheet_names = workbook_tables[index]
+            future = executor.submit(export_workbook_task, context.create_worker_context(),
+                                     excel_file, filename, table_sheet_names)
+            running[future] = index
+        if local_order:
+            index = local_order.pop(0)
+            excel_file, filename, table_sheet_names = workbook_tables[index]
+            finished[index] = export_workbook_task(context.create_worker_context(jobs), excel_file, filename, table_sheet_names)
+            done = [future for future in running if future.done()]
+        else:
+            done, not_done = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            finished[running.pop(future)] = future.result()
+        # 按文件顺序而不是完成顺序打印日志
+        while next_index in finished:
+            outputs, changed_files, log, failed, duration, peak_memory = finished[next_index]
+            print(log, end='')
+            if failed:
+                # 和串行导表一样，遇到错误就退出，还没开始的文件不再导出
+                for future in running:
+                    future.cancel()
+                sys.exit()
+            context.merge_worker_result(outputs, changed_files)
+            next_index += 1
+    return [(outputs, duration, peak_memory) for outputs, changed_files, log, failed, duration, peak_memory in
+            (finished[index] for index in range(len(workbook_tables)))]
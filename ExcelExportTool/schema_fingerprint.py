@@ -0,0 +1,77 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 表结构指纹：XxxData.cs只由表头前5行决定，XxxKeys.cs只由主键列表决定
+# 记录每个c#文件生成时的指纹，指纹没有变化且文件还在时不重新生成，只修改了数据时只重新生成json，Unity不需要重新编译
+# 指纹包含生成c#的代码，修改了c#模板后全部重新生成
+# 每个c#文件的指纹单独保存为一个文件，写入成功后才记录，并行导表的子进程各自读写，不需要汇总
+# 同时记录写入后c#文件的内容哈希：--no-cache或多机导表等不记录指纹的导表改写了文件时，内容对不上就重新生成
+
+import os
+import json
+import hashlib
+
+from input_cache import file_hash
+
+FINGERPRINT_FOLDER_NAME = "schema_fingerprints"
+TOOL_FOLDER = os.path.dirname(os.path.abspath(__file__))
+# 决定c#脚本内容的代码
+GENERATOR_MODULES = ("cs_generation.py", "worksheet_data.py", "schema_fingerprint.py")
+
+
+def get_generator_version():
+    sha1 = hashlib.sha1()
+    for module_name in GENERATOR_MODULES:
+        with open(os.path.join(TOOL_FOLDER, module_name), 'rb') as file:
+            sha1.update(file.read())
+    return sha1.hexdigest()
+
+
+# 关闭导表缓存或没有状态目录（例如多机导表的工作节点）时返回None，总是重新生成
+# 生成代码的版本每次导表只计算一次，保存在context中
+def get_schema_fingerprints(context):
+    if not context.use_cache or context.state_folder is None:
+        return None
+    if context.generator_version is None:
+        context.generator_version = get_generator_version()
+    return SchemaFingerprints(context.state_folder, context.generator_version)
+
+
+class SchemaFingerprints:
+    def __init__(self, state_folder, generator_version):
+        self.folder = os.path.join(state_folder, FINGERPRINT_FOLDER_NAME)
+        self.generator_version = generator_version
+
+    # 表头中可能有日期等json无法直接保存的值，统一转为字符串
+    def compute(self, schema):
+        data = json.dumps([self.generator_version, schema], ensure_ascii=False, default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    # 按c#文件的绝对路径区分，更换输出目录后重新生成
+    def get_record_path(self, file_path):
+        return os.path.join(self.folder, hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest())
+
+    # c#文件还是记录时的内容、且生成它时的表结构与schema相同时返回True
+    def is_unchanged(self, file_path, schema):
+        try:
+            with open(self.get_record_path(file_path), 'r', encoding='utf-8') as file:
+                record = file.read().split()
+            return record == [self.compute(schema), file_hash(file_path)]
+        except OSError:
+            return False
+
+    def record(self, file_path, schema):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.get_record_path(file_path), 'w', encoding='utf-8') as file:
+            file.write(f"{self.compute(schema)} {file_hash(file_path)}")
+
+    # 完整导表后删除已经不再生成的c#文件的指纹
+    def keep_only(self, file_paths):
+        if not os.path.isdir(self.folder):
+            return
+        record_names = set(os.path.basename(self.get_record_path(file_path)) for file_path in file_paths)
+        for name in os.listdir(self.folder):
+            if name not in record_names:
+                os.remove(os.path.join(self.folder, name))
@@ -0,0 +1,40 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 子进程把大段文本放在共享内存中交给主进程，只通过进程间通信传递共享内存的名字和长度
+# 主进程读取后负责释放；Windows上共享内存在最后一个句柄关闭时就会被回收，所以直接返回字节
+
+import os
+from multiprocessing import shared_memory, resource_tracker
+
+
+# 返回可以传给主进程的句柄：None、("bytes", 内容)或("shm", 共享内存名, 长度)
+def store_shared_text(text):
+    data = text.encode('utf-8')
+    if not data:
+        return None
+    if os.name == 'nt':
+        return "bytes", data
+    buffer = shared_memory.SharedMemory(create=True, size=len(data))
+    buffer.buf[:len(data)] = data
+    # 共享内存由主进程释放，子进程退出时不能被resource_tracker回收
+    resource_tracker.unregister(buffer._name, "shared_memory")
+    buffer.close()
+    return "shm", buffer.name, len(data)
+
+
+# 读取句柄中的文本并释放共享内存
+def load_shared_text(handle):
+    if handle is None:
+        return ""
+    if handle[0] == "bytes":
+        return handle[1].decode('utf-8')
+    kind, name, size = handle
+    buffer = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(buffer.buf[:size]).decode('utf-8')
+    finally:
+        buffer.close()
+        buffer.unlink()
@@ -0,0 +1,152 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 拆分表：一张逻辑表可以拆成多个文件，例如Item_01.xlsx … Item_12.xlsx
+# 文件名为“表名_编号”的文件中同名的数据表sheet视为同一张表的分表，按编号顺序逐个读取合并导出
+
+import os
+import re
+from collections import deque
+from itertools import islice
+from worker_pool import get_worker_pool
+
+from excel_processing import load_workbook, read_cell_values, HEADER_ROW_COUNT
+from memory_budget import estimate_workbook_memory
+from build_manifest import BuildManifest
+
+SPLIT_PART_PATTERN = re.compile(r'^(.+)_(\d+)\.[^.]+$')
+
+# 分表之间必须一致的表头行：类型、标签、字段名、默认值
+COMPATIBLE_HEADER_ROWS = range(3, 7)
+
+
+# 返回(表名, 编号)，不符合分表命名的文件返回None
+def get_split_part(filename):
+    match = SPLIT_PART_PATTERN.match(os.path.basename(filename))
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def is_split_part_of(filename, other_filename):
+    part = get_split_part(filename)
+    other_part = get_split_part(other_filename)
+    return part is not None and other_part is not None and part[0] == other_part[0]
+
+
+# 同一目录下表名相同的分表才是同一张拆分表，和group_split_tables的分组规则一致
+def is_same_split_table(file_path, other_file_path):
+    return os.path.dirname(file_path) == os.path.dirname(other_file_path) and is_split_part_of(file_path, other_file_path)
+
+
+def check_split_headers(header_rows, first_header_rows):
+    # 返回不一致的行号列表
+    return [row for row in COMPATIBLE_HEADER_ROWS if header_rows[row - 1] != first_header_rows[row - 1]]
+
+
+# 把文件中的数据表按逻辑表分组，file_sheet_map为数据源key到数据表sheet名列表的映射
+# 返回(每个文件单独导出的数据表[(excel_file, filename, [sheet_name, ...]), ...],
+#      需要合并的拆分表[(sheet_name, [(excel_file, filename), ...]), ...])，分表按编号排序
+def group_split_tables(excel_files, file_sheet_map, source_folder):
+    sheet_map = {excel_file: file_sheet_map[BuildManifest.get_source_key(excel_file, source_folder)] for excel_file, filename in excel_files}
+    groups = {}
+    for excel_file, filename in excel_files:
+        part = get_split_part(filename)
+        for sheet_name in sheet_map[excel_file]:
+            group_key = (os.path.dirname(excel_file), part[0], sheet_name) if part else (excel_file, sheet_name)
+            groups.setdefault(group_key, []).append((excel_file, filename))
+
+    split_tables = []
+    merged_sheets = set()
+    for group_key, parts in groups.items():
+        if len(parts) > 1:
+            sheet_name = group_key[-1]
+            split_tables.append((sheet_name, sorted(parts, key=lambda item: get_split_part(item[1]))))
+            merged_sheets.update((excel_file, sheet_name) for excel_file, filename in parts)
+
+    workbook_tables = [(excel_file, filename, [sheet_name for sheet_name in sheet_map[excel_file]
+                                               if (excel_file, sheet_name) not in merged_sheets])
+                       for excel_file, filename in excel_files]
+    return workbook_tables, split_tables
+
+
+# 拖拽单个分表导出时，同一目录下的其他分表也要一起导出，否则合并后的表会缺少数据
+def expand_split_parts(file_paths):
+    expanded = []
+    for file_path in file_paths:
+        part = get_split_part(file_path)
+        candidates = [file_path]
+        if part is not None:
+            folder_name = os.path.dirname(os.path.abspath(file_path))
+            candidates = [os.path.join(folder_name, name) for name in sorted(os.listdir(folder_name))
+                          if is_split_part_of(name, file_path) and os.path.splitext(name)[1] == os.path.splitext(file_path)[1]]
+        for candidate in candidates:
+            if os.path.abspath(candidate) not in [os.path.abspath(path) for path in expanded]:
+                expanded.append(candidate)
+    return expanded
+
+
+# 逐行读取一个分表中的sheet，包括表头，读完后关闭文件
+def iter_part_rows(excel_file, sheet_name, engine):
+    wb = load_workbook(excel_file, True, engine, [sheet_name])
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+# 在子进程中读取一个分表中的sheet，返回所有行的值
+def read_table_part(excel_file, sheet_name, engine):
+    rows = iter_part_rows(excel_file, sheet_name, engine)
+    header_rows = [read_cell_values(rows) for _ in range(HEADER_ROW_COUNT)]
+    # 完全为空的行直接丢弃，减少传回主进程的数据量
+    return header_rows + [row for row in rows if any(value is not None for value in row)]
+
+
+# 合并后的表，提供和openpyxl相同的worksheet接口给WorksheetData使用
+# 按编号顺序逐个读取分表，表头取第一个分表的，不在内存中保留整张表
+# context.jobs大于1且不是流式读取时，在进程池中提前读取后面的分表：读取中和等待合并的分表不超过jobs个，
+# 设置了内存预算时预估占用之和也不超过预算（至少一个）
+class MergedWorksheet:
+    def __init__(self, title, excel_files, context):
+        self.title = title
+        self.excel_files = excel_files
+        self.context = context
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        for index, rows in enumerate(self.__iter_parts()):
+            yield from rows if index == 0 else islice(rows, HEADER_ROW_COUNT, None)
+
+    def __iter_parts(self):
+        context = self.context
+        if context.jobs <= 1 or context.streaming:
+            for excel_file in self.excel_files:
+                yield iter_part_rows(excel_file, self.title, context.engine)
+            return
+
+        budget = None
+        estimates = [0] * len(self.excel_files)
+        if context.memory_budget is not None:
+            budget = context.memory_budget * 1024 * 1024
+            estimates = [estimate_workbook_memory(excel_file, [self.title], True, context.engine) for excel_file in self.excel_files]
+        executor = get_worker_pool(context.jobs)
+        pending = deque()
+        next_index = 0
+        try:
+            while next_index < len(self.excel_files) or pending:
+                while next_index < len(self.excel_files) and len(pending) < context.jobs and \
+                        (budget is None or not pending or sum(estimates[index] for index, future in pending) + estimates[next_index] <= budget):
+                    future = executor.submit(read_table_part, self.excel_files[next_index], self.title, context.engine)
+                    pending.append((next_index, future))
+                    next_index += 1
+                index, future = pending.popleft()
+                yield iter(future.result())
+        finally:
+            for index, future in pending:
+                future.cancel()
+
+
+def load_split_table(context, excel_files, sheet_name):
+    return MergedWorksheet(sheet_name, excel_files, context)
@@ -0,0 +1,216 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 表格缓存：按数据源文件的内容哈希保存导出的sheet读取到的单元格值（表头6行和数据行），再次导出内容相同的文件时不再打开Excel
+# 只和文件内容、读取代码有关，与输出目录、c#模板和类型转换无关：只改了这些时导表缓存失效，但不需要重新解析Excel
+# 每个文件一个目录，sheets.json记录缓存了哪些sheet，每个sheet的行分批pickle后用gzip压缩保存
+# 在导出文件的过程中顺便记录，所有sheet都完整读取过才写入缓存
+
+import os
+import json
+import gzip
+import pickle
+import shutil
+import hashlib
+import tempfile
+
+import openpyxl
+
+from input_cache import file_hash
+
+TABLE_CACHE_FOLDER_NAME = "table_cache"
+SHEET_LIST_FILE_NAME = "sheets.json"
+# 表头检查读取到的表头与缓存目录同名、单独保存，拆分表的分表等只导出了部分sheet的文件也能取到全部表头
+HEADER_FILE_SUFFIX = ".headers"
+TEMP_FOLDER_PREFIX = ".tmp"
+# 每批pickle的行数，读取缓存时一次只解压一批
+ROW_BATCH_SIZE = 1000
+TOOL_FOLDER = os.path.dirname(os.path.abspath(__file__))
+# 决定读取到的单元格值的代码，修改后旧的缓存不再使用
+READER_MODULES = ("excel_processing.py", "xlsx_reader.py", "csv_reader.py", "header_check.py", "table_cache.py")
+
+
+def get_reader_version(engine):
+    sha1 = hashlib.sha1()
+    sha1.update(f"{engine}|{openpyxl.__version__}".encode('utf-8'))
+    for module_name in READER_MODULES:
+        with open(os.path.join(TOOL_FOLDER, module_name), 'rb') as file:
+            sha1.update(file.read())
+    return sha1.hexdigest()[:16]
+
+
+# 关闭导表缓存或没有状态目录（例如多机导表的工作节点）时返回None
+# 读取代码的版本每次导表只计算一次，保存在context中
+def get_table_cache(context):
+    if not context.use_cache or context.state_folder is None:
+        return None
+    if context.reader_version is None:
+        context.reader_version = get_reader_version(context.engine)
+    return TableCache(context.state_folder, context.reader_version, context.content_hashes)
+
+
+class TableCache:
+    # content_hashes为{文件绝对路径: 内容哈希}，检查导表缓存时已经计算过哈希的文件不再重新计算
+    def __init__(self, state_folder, reader_version, content_hashes=None):
+        self.folder = os.path.join(state_folder, TABLE_CACHE_FOLDER_NAME)
+        self.reader_version = reader_version
+        self.content_hashes = content_hashes if content_hashes is not None else {}
+
+    def get_entry_name(self, content_hash):
+        return f"{content_hash}_{self.reader_version}"
+
+    def get_entry_folder(self, excel_file):
+        content_hash = self.content_hashes.get(os.path.abspath(excel_file))
+        if content_hash is None:
+            content_hash = file_hash(excel_file)
+        return os.path.join(self.folder, self.get_entry_name(content_hash))
+
+    # 缓存中有全部需要导出的sheet时返回缓存的workbook，否则读取文件并在导出过程中记录
+    def open_workbook(self, excel_file, sheet_names, load):
+        entry_folder = self.get_entry_folder(excel_file)
+        wb = self.__load(entry_folder, sheet_names)
+        if wb is not None:
+            return wb
+        os.makedirs(self.folder, exist_ok=True)
+        temp_folder = tempfile.mkdtemp(prefix=TEMP_FOLDER_PREFIX, dir=self.folder)
+        return RecordingWorkbook(load(), temp_folder, entry_folder)
+
+    # 返回表头检查记录的[(sheet名, 表头), ...]，没有记录时返回None
+    def load_headers(self, excel_file):
+        try:
+            with open(self.get_entry_folder(excel_file) + HEADER_FILE_SUFFIX, 'rb') as file:
+                return pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save_headers(self, excel_file, headers):
+        os.makedirs(self.folder, exist_ok=True)
+        header_path = self.get_entry_folder(excel_file) + HEADER_FILE_SUFFIX
+        temp_path = f"{header_path}.{os.getpid()}"
+        with open(temp_path, 'wb') as file:
+            pickle.dump(headers, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, header_path)
+
+    def __load(self, entry_folder, sheet_names):
+        try:
+            with open(os.path.join(entry_folder, SHEET_LIST_FILE_NAME), 'r', encoding='utf-8') as file:
+                cached_names = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not all(name in cached_names for name in sheet_names):
+            return None
+        return CachedWorkbook([CachedWorksheet(name, os.path.join(entry_folder, f"{cached_names.index(name)}.rows"))
+                               for name in sheet_names])
+
+    # 完整导表后只保留本次数据源文件的缓存，删除旧内容、旧读取代码的缓存和中途退出时留下的临时目录，返回删除的数量
+    def prune(self, content_hashes):
+        if not os.path.isdir(self.folder):
+            return 0
+        entry_names = set()
+        for content_hash in content_hashes:
+            entry_name = self.get_entry_name(content_hash)
+            entry_names.update((entry_name, entry_name + HEADER_FILE_SUFFIX))
+        remove_count = 0
+        for name in os.listdir(self.folder):
+            if name not in entry_names:
+                path = os.path.join(self.folder, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+                remove_count += 1
+        return remove_count
+
+
+# 从缓存读取的workbook，提供和openpyxl相同的最小接口
+class CachedWorkbook:
+    def __init__(self, worksheets):
+        self.worksheets = worksheets
+
+    @property
+    def sheetnames(self):
+        return [sheet.title for sheet in self.worksheets]
+
+    def close(self):
+        pass
+
+
+class CachedWorksheet:
+    def __init__(self, title, rows_path):
+        self.title = title
+        self.rows_path = rows_path
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        row_index = 0
+        with gzip.open(self.rows_path, 'rb') as file:
+            while True:
+                try:
+                    batch = pickle.load(file)
+                except EOFError:
+                    return
+                for row in batch:
+                    row_index += 1
+                    if max_row is not None and row_index > max_row:
+                        return
+                    if row_index >= min_row:
+                        yield row if max_col is None else row[:max_col]
+
+
+# 包装读取出来的workbook，导出时逐行记录读取到的值，关闭时写入缓存
+class RecordingWorkbook:
+    def __init__(self, wb, temp_folder, entry_folder):
+        self.wb = wb
+        self.temp_folder = temp_folder
+        self.entry_folder = entry_folder
+        self.worksheets = [RecordingWorksheet(sheet, os.path.join(temp_folder, f"{index}.rows"))
+                           for index, sheet in enumerate(wb.worksheets)]
+
+    @property
+    def sheetnames(self):
+        return [sheet.title for sheet in self.worksheets]
+
+    # 有sheet没有完整读取时（例如预读取后没有导出）丢弃记录
+    def close(self):
+        self.wb.close()
+        if all(sheet.recorded for sheet in self.worksheets):
+            with open(os.path.join(self.temp_folder, SHEET_LIST_FILE_NAME), 'w', encoding='utf-8') as file:
+                json.dump(self.sheetnames, file, ensure_ascii=False)
+            # 上次缓存的sheet不全时整个替换
+            shutil.rmtree(self.entry_folder, ignore_errors=True)
+            try:
+                os.replace(self.temp_folder, self.entry_folder)
+                return
+            except OSError:
+                # 多个进程同时导出内容相同的文件时，其他进程已经写入了缓存
+                pass
+        shutil.rmtree(self.temp_folder, ignore_errors=True)
+
+
+class RecordingWorksheet:
+    def __init__(self, sheet, rows_path):
+        self.sheet = sheet
+        self.title = sheet.title
+        self.rows_path = rows_path
+        self.recorded = False
+
+    # find_data_extent等读取原工作表属性的代码不受影响
+    def __getattr__(self, name):
+        return getattr(self.sheet, name)
+
+    # 总是从第1行开始读取和记录，只返回min_row之后的行
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        with gzip.open(self.rows_path, 'wb', compresslevel=1) as file:
+            batch = []
+            rows = self.sheet.iter_rows(max_row=max_row, max_col=max_col, values_only=True)
+            for row_index, row in enumerate(rows, start=1):
+                batch.append(row)
+                if len(batch) >= ROW_BATCH_SIZE:
+                    pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+                    batch = []
+                if row_index >= min_row:
+                    yield row
+            if batch:
+                pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+        self.recorded = True
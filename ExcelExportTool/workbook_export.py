@@ -0,0 +1,57 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 单个文件/拆分表的导出流程，输出目录和导表选项通过BuildContext传入，可以在子进程中执行
+
+import os
+from excel_processing import ENUM_SHEET_TAG
+from export_pipeline import open_workbook
+from table_cache import get_table_cache
+from cs_generation import generate_enum_file_from_sheet
+from worksheet_data import WorksheetData
+from split_table import load_split_table
+from console_output import GREEN, RESET, SEPARATOR
+
+
+def export_sheet(context, sheet):
+    sheet_data = WorksheetData(sheet, context)
+    sheet_data.generate_json()
+    sheet_data.generate_script()
+
+
+# 打开一次文件，导出其中所有的数据表sheet和Enum-sheet，返回生成的文件列表
+def export_workbook(context, excel_file, filename, table_sheet_names):
+    # 先读取workbook.xml中的sheet名称，只解析需要导出的sheet；内容没变过的文件从表格缓存读取
+    wb = open_workbook(excel_file, table_sheet_names, context.streaming, context.engine, get_table_cache(context))
+    return export_loaded_workbook(context, wb, excel_file, filename, table_sheet_names)
+
+
+# 导出已经打开的文件，wb为None表示没有需要导出的sheet
+def export_loaded_workbook(context, wb, excel_file, filename, table_sheet_names):
+    if wb is None:
+        return []
+    print(SEPARATOR)
+    print(f"即将开始处理文件{os.path.dirname(excel_file)}\\{GREEN}{filename}{RESET}")
+    created_count = len(context.created_files)
+    for sheet in wb.worksheets:
+        if sheet.title in table_sheet_names:
+            export_sheet(context, sheet)
+        elif sheet.title.startswith(ENUM_SHEET_TAG):
+            generate_enum_file_from_sheet(context, sheet, ENUM_SHEET_TAG)
+    # 只读模式下需要手动关闭文件句柄
+    wb.close()
+    context.flush_write_log()
+    return context.created_files[created_count:]
+
+
+# 拆分表的各个分表按编号顺序读取合并导出，返回生成的文件列表
+def export_split_table(context, sheet_name, parts):
+    print(SEPARATOR)
+    print(f"即将合并拆分表{GREEN}{sheet_name}{RESET}：{'、'.join(filename for excel_file, filename in parts)}")
+    created_count = len(context.created_files)
+    sheet = load_split_table(context, [excel_file for excel_file, filename in parts], sheet_name)
+    export_sheet(context, sheet)
+    context.flush_write_log()
+    return context.created_files[created_count:]
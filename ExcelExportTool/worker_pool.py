@@ -0,0 +1,53 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 进程内共享的常驻子进程池：子进程启动时预先导入openpyxl和导表模块，之后在多个任务、多次导表之间复用
+# Windows上子进程用spawn方式启动，每次新建进程池都要重新导入这些模块，复用后只在第一次创建时付出启动开销
+# 进程池属于整个进程而不是某一次导表，所以放在模块级，不放在BuildContext中
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+worker_pool = None
+worker_count = 0
+# 创建进程池的进程id，fork出的子进程会复制这些全局变量，但不能使用父进程的进程池
+worker_pool_pid = None
+
+
+def warm_up():
+    import openpyxl
+    import workbook_export
+
+
+# 返回至少有max_workers个子进程的进程池；已有的进程池足够大时直接复用
+# 同时运行的任务数量由调用方控制
+def get_worker_pool(max_workers):
+    global worker_pool, worker_count, worker_pool_pid
+    if worker_pool_pid != os.getpid():
+        worker_pool = None
+        worker_count = 0
+    # 子进程异常退出后进程池不能再使用，需要重新创建
+    if worker_pool is not None and worker_count >= max_workers and not getattr(worker_pool, "_broken", False):
+        return worker_pool
+    shutdown_worker_pool()
+    worker_pool = ProcessPoolExecutor(max_workers=max_workers, initializer=warm_up)
+    worker_count = max_workers
+    worker_pool_pid = os.getpid()
+    # 提交空任务让子进程立即启动并完成预导入，与主进程的表头检查等工作重叠
+    for _ in range(max_workers):
+        worker_pool.submit(int)
+    return worker_pool
+
+
+def get_cpu_count():
+    return os.cpu_count() or 1
+
+
+def shutdown_worker_pool():
+    global worker_pool, worker_count
+    if worker_pool is not None and worker_pool_pid == os.getpid():
+        worker_pool.shutdown(cancel_futures=True)
+    worker_pool = None
+    worker_count = 0
@@ -4,29 +4,161 @@
 # All rights reserved
 
 
-from cs_generation import generate_script_file, generate_enum_file, write_to_file
-from excel_processing import read_cell_values, check_repeating_values
+from cs_generation import generate_script_file, generate_enum_file, write_to_file, keep_unchanged_file
+from excel_processing import read_cell_values, check_repeating_values, find_data_extent, get_column_count, FIELD_NAME_ROW, HEADER_ROW_COUNT
 from data_processing import convert_to_type, available_csharp_enum_name
+from shared_buffer import store_shared_text, load_shared_text
+from worker_pool import get_worker_pool
+from schema_fingerprint import get_schema_fingerprints
+import io
+import os
 import sys
 import json
+from collections import deque
+from contextlib import redirect_stdout
+from itertools import islice, chain
 
 import json
 
+# 大表分块并行转换时每块的行数
+ROW_CHUNK_SIZE = 20000
+
+
+# 把数据行转换为(主键单元格的值, json中的主键, 行数据)，first_serial_key为string主键表中第一行的自增主键
+# row_schema为(字段名, 类型, 标签, 默认值, 是否生成主键枚举)
+def iter_converted_rows(rows, row_schema, first_serial_key):
+    field_names, data_types, data_labels, default_values, need_generate_keys = row_schema
+    serial_key = first_serial_key
+    for row in rows:
+        row_data = {}
+        row_data_key = None
+        for col_index, value in enumerate(row):
+            if col_index == 0 :
+                if need_generate_keys:
+                    row_data_key = serial_key
+                    serial_key += 1
+                else:
+                    row_data_key = int(value)
+
+            data_label = data_labels[col_index + 1]
+
+            if data_label == "ignore":
+                continue
+
+            default_value = default_values[col_index + 1]
+            data_name = field_names[col_index + 1]
+            data_type_str = data_types[col_index + 1]
+
+            if value is None:
+                if default_value is None:
+                    if data_label == "required":
+                        print(f"{data_name}的label为required！但是值为空且没有默认值，退出导表")
+                        sys.exit()
+                    else:
+                        value = convert_to_type(data_type_str, value)
+                else:
+                    value = convert_to_type(data_type_str, default_value)
+            else:
+                value = convert_to_type(data_type_str, value)
+
+            row_data[data_name] = value
+
+        yield row[0], row_data_key, row_data
+
+
+# 转换一批数据行，返回([(主键单元格的值, json中的主键), ...], {json中的主键: 行数据})，行数据为空的行不写入json
+def convert_rows(rows, row_schema, first_serial_key):
+    keys = []
+    data = {}
+    for key, row_data_key, row_data in iter_converted_rows(rows, row_schema, first_serial_key):
+        keys.append((key, row_data_key))
+        if row_data:
+            data[row_data_key] = row_data
+    return keys, data
+
+
+# 把{主键: 行数据}序列化为缩进4格的json对象去掉首尾花括号后的部分
+# 按顺序用join_json_fragments拼接后，与整张表一次序列化的结果完全一致
+def serialize_json_fragment(data):
+    if not data:
+        return ""
+    return json.dumps(data, ensure_ascii=False, indent=4)[2:-2]
+
+
+def join_json_fragments(fragments):
+    fragments = [fragment for fragment in fragments if fragment]
+    if not fragments:
+        return "{}"
+    return "{\n" + ",\n".join(fragments) + "\n}"
+
+
+# 在子进程中转换并序列化一个分块，返回(主键列表, json片段的共享内存句柄, 错误日志)
+# 行数据不再以嵌套字典的形式pickle回主进程，主进程直接拼接json片段
+def convert_rows_task(rows, row_schema, first_serial_key):
+    log = io.StringIO()
+    with redirect_stdout(log):
+        try:
+            keys, data = convert_rows(rows, row_schema, first_serial_key)
+            return keys, store_shared_text(serialize_json_fragment(data)), None
+        except SystemExit:
+            return None, None, log.getvalue()
+
+
+# 释放还没有读取的分块
+def release_chunk_results(futures):
+    for future in futures:
+        if not future.cancelled() and future.exception() is None:
+            load_shared_text(future.result()[1])
+
+
 class WorksheetData:
-    def __init__(self, worksheet):
+    # context.jobs大于1时，行数很多的表会分块在多个子进程中转换
+    def __init__(self, worksheet, context):
         self.name = worksheet.title
         self.worksheet = worksheet
-        self.cell_values = {i: read_cell_values(worksheet, i) for i in range(1, 7)}
+        self.context = context
+        self.streaming = context.streaming
+        self.jobs = context.jobs
+        # 表头6行只读一次，之后的数据行以值元组的形式逐行迭代
+        # 能提前得到真实数据范围时，只遍历到最后一个有主键的行和最后一个有字段名的列
+        max_row, max_col = find_data_extent(worksheet)
+        rows = worksheet.iter_rows(max_row=max_row, max_col=max_col, values_only=True)
+        header_rows = [read_cell_values(rows) for _ in range(HEADER_ROW_COUNT)]
+        self.column_count = get_column_count(header_rows[FIELD_NAME_ROW - 1])
+        self.cell_values = {i + 1: self.__fit_width(row) for i, row in enumerate(header_rows)}
         self.remarks = self.cell_values[1]
         self.headers = self.cell_values[2]
         self.data_types = self.cell_values[3]
         self.data_labels = self.cell_values[4]
         self.field_names = self.cell_values[5]
         self.default_values = self.cell_values[6]
-        self.row_data = list(worksheet.iter_rows(min_row=7, min_col=2))
+        # 数据行去掉第1列（策划说明列）；流式模式下只能遍历一次，不缓存整张表
+        data_rows = self.__iter_data_rows(rows)
+        self.row_data = data_rows if self.streaming else list(data_rows)
+        self.row_keys = None
         check_repeating_values(self.field_names)
         self.need_generate_keys = self.__need_generate_keys()
 
+    def __fit_width(self, row):
+        row = list(row[:self.column_count])
+        return row + [None] * (self.column_count - len(row))
+
+    def __iter_data_rows(self, rows):
+        # 主键为空的行不导出，所以整列设置了格式产生的大量空行会被跳过
+        # 但主键为空的行有数据时（无论在中间还是在最后），说明策划漏填了主键
+        orphan_row = None
+        for row_number, row in enumerate(rows, start=HEADER_ROW_COUNT + 1):
+            row = row[1:self.column_count]
+            if row and row[0] is not None:
+                if orphan_row is not None:
+                    break
+                yield row
+            elif orphan_row is None and any(value is not None for value in row):
+                orphan_row = row_number
+        if orphan_row is not None:
+            print(f"{self.name}第{orphan_row}行的主键为空，但该行有数据，退出导表")
+            sys.exit()
+
     def __need_generate_keys(self):
         property_types = self.__get_properties_dict()
         return list(property_types.values())[0] == "string"
@@ -52,81 +184,114 @@ class WorksheetData:
             if self.data_labels[index] != "ignore" and index > 0
         }
 
-    def __generate_enum_keys_csfile(self, output_folder):
+    # 主键在generate_json时已经收集过，流式模式下数据行无法再次遍历
+    def __get_row_keys(self):
+        return self.row_keys if self.row_keys is not None else [row[0] for row in self.row_data]
+
+    def __generate_enum_keys_csfile(self, output_folder, row_keys, on_written=None):
         enum_type_name = f"{self.name}Keys"
         enum_names = []
         enum_values = []
         index = 0
 
-        for row in self.row_data:
-            for col_index, cell in enumerate(row):
-                if col_index == 0:
-                    if available_csharp_enum_name(cell.value):
-                        enum_names.append(cell.value)
-                        enum_values.append(index)
-                        index += 1
-                    else:
-                        print(f"第{index + 1}行第1列的值{cell.value}不是合法的c#枚举名，无法生成主键！")
-                        sys.exit()
+        for key in row_keys:
+            if available_csharp_enum_name(key):
+                enum_names.append(key)
+                enum_values.append(index)
+                index += 1
+            else:
+                print(f"第{index + 1}行第1列的值{key}不是合法的c#枚举名，无法生成主键！")
+                sys.exit()
 
-        generate_enum_file(enum_type_name, enum_names, enum_values, None, "Data.TableScript", output_folder)
+        generate_enum_file(self.context, enum_type_name, enum_names, enum_values, None, "Data.TableScript", output_folder, on_written)
 
 
-    def generate_json(self, output_folder):
-        data = {}
-        serial_key = 0
-        for row in self.row_data:
-            row_data = {}
-            row_data_key = None
-            row_data_dict = {}
-            for col_index, cell in enumerate(row):
-                if col_index == 0 :
-                    if self.need_generate_keys:
-                        row_data_key = serial_key
-                        serial_key += 1
-                    else:
-                        row_data_key = int(cell.value)
+    # 同一份数据输出到工程和客户端两个json目录，只遍历一次数据行
+    def generate_json(self):
+        self.row_keys = []
+        unique_keys = set()
+        fragments = []
+        for keys, fragment in self.__convert_row_data():
+            for key, row_data_key in keys:
+                self.row_keys.append(key)
+                unique_key = key if self.need_generate_keys else row_data_key
+                # 拆分表合并、分块并行转换后也要保证主键唯一
+                if unique_key in unique_keys:
+                    print(f"{self.name}的主键{unique_key}重复，退出导表")
+                    sys.exit()
+                unique_keys.add(unique_key)
+            fragments.append(fragment)
 
-                data_label = self.data_labels[col_index + 1]
+        file_content = join_json_fragments(fragments)
+        for output_folder in self.context.json_folders:
+            file_path = f"{output_folder}/{self.name}Config.json"
+            write_to_file(self.context, file_content, file_path)
 
-                if data_label == "ignore":
-                    continue
+    def __get_row_schema(self):
+        return self.field_names, self.data_types, self.data_labels, self.default_values, self.need_generate_keys
 
-                default_value = self.default_values[col_index + 1]
-                data_name = self.field_names[col_index + 1]
-                data_type_str = self.data_types[col_index + 1]
+    # 依次产出(主键列表, json片段)
+    def __convert_row_data(self):
+        rows = iter(self.row_data)
+        row_schema = self.__get_row_schema()
+        first_chunk = list(islice(rows, ROW_CHUNK_SIZE))
+        # 行数不多的表直接在当前进程转换，整张表一次序列化
+        if self.jobs <= 1 or len(first_chunk) < ROW_CHUNK_SIZE:
+            keys, data = convert_rows(chain(first_chunk, rows), row_schema, 0)
+            yield keys, serialize_json_fragment(data)
+            return
 
-                value = None
-                if cell.value is None:
-                    if default_value is None:
-                        if data_label == "required":
-                            print(f"{data_name}的label为required！但是值为空且没有默认值，退出导表")
-                            sys.exit()
-                        else:
-                            value = convert_to_type(data_type_str, cell.value)
-                    else:
-                        value = convert_to_type(data_type_str, default_value)
-                else:
-                    value = convert_to_type(data_type_str, cell.value)
-
-                row_data[data_name] = value
-                row_data_dict[row_data_key] = row_data
-
-            data.update(row_data_dict)
-
-        file_content = json.dumps(data, ensure_ascii=False, indent=4)
-        file_path = f"{output_folder}/{self.name}Config.json"
-        write_to_file(file_content, file_path)
+        # 大表按行分块，在子进程中转换和序列化后按顺序合并，同时处理中的分块数量有上限以控制内存
+        executor = get_worker_pool(self.jobs)
+        pending = deque()
+        chunk = first_chunk
+        serial_key = 0
+        try:
+            while chunk or pending:
+                if chunk:
+                    pending.append(executor.submit(convert_rows_task, chunk, row_schema, serial_key))
+                    serial_key += len(chunk)
+                    chunk = list(islice(rows, ROW_CHUNK_SIZE))
+                if not chunk or len(pending) >= self.jobs * 2:
+                    keys, handle, log = pending.popleft().result()
+                    if log is not None:
+                        print(log, end='')
+                        sys.exit()
+                    yield keys, load_shared_text(handle)
+        finally:
+            # 中途退出（分块出错或主键重复）时取消还没开始的分块，释放已经完成的分块
+            for future in pending:
+                future.cancel()
+            release_chunk_results(pending)
 
 
-    def generate_script(self, output_folder):
-        properties_dict = self.__get_properties_dict()
-        property_remakes = self.__get_property_remarks()
-        generate_script_file(self.name, properties_dict, property_remakes, output_folder, self.need_generate_keys)
+    def generate_script(self):
+        output_folder = self.context.csfile_folder
+        fingerprints = get_schema_fingerprints(self.context)
+        # XxxData.cs只由表头前5行和主键类型决定，只修改了数据时不重新生成，Unity不需要重新编译
+        schema = [self.remarks, self.headers, self.data_types, self.data_labels, self.field_names, self.need_generate_keys]
+        file_path = os.path.join(output_folder, f"{self.name}Data.cs")
+        if fingerprints is not None and fingerprints.is_unchanged(file_path, schema):
+            keep_unchanged_file(self.context, file_path)
+        else:
+            properties_dict = self.__get_properties_dict()
+            property_remakes = self.__get_property_remarks()
+            generate_script_file(self.context, self.name, properties_dict, property_remakes, output_folder, self.need_generate_keys,
+                                 on_written=self.__get_fingerprint_recorder(fingerprints, file_path, schema))
         # 如果properties_dict没有名为id的元素，或者名为id字段的元素类型不是int，则生成枚举文件
+        # 主键枚举只由主键列表决定，增删或调整主键顺序时才重新生成
         if self.need_generate_keys:
-            self.__generate_enum_keys_csfile(output_folder)
-
-
-
+            row_keys = self.__get_row_keys()
+            file_path = os.path.join(output_folder, f"{self.name}Keys.cs")
+            if fingerprints is not None and fingerprints.is_unchanged(file_path, row_keys):
+                keep_unchanged_file(self.context, file_path)
+            else:
+                self.__generate_enum_keys_csfile(output_folder, row_keys,
+                                                 self.__get_fingerprint_recorder(fingerprints, file_path, row_keys))
 
+    # 文件写入成功后再记录指纹，写入失败时下次仍会重新生成
+    @staticmethod
+    def __get_fingerprint_recorder(fingerprints, file_path, schema):
+        if fingerprints is None:
+            return None
+        return lambda: fingerprints.record(file_path, schema)
@@ -0,0 +1,272 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 基于zipfile和iterparse的轻量xlsx读取器，只解析单元格的值，不创建openpyxl的Cell/Style对象
+# 对外提供和openpyxl相同的最小接口：workbook.worksheets、worksheet.title、worksheet.iter_rows(values_only=True)
+
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+# 日期格式的判断和序列号的转换直接使用openpyxl的实现，保证两个引擎读取到的值完全一致
+from openpyxl.styles.numbers import is_date_format, is_timedelta_format, builtin_format_code
+from openpyxl.utils.datetime import from_excel, from_ISO8601, WINDOWS_EPOCH, MAC_EPOCH
+
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+WORKSHEET_REL_SUFFIX = "/worksheet"
+
+
+def local_name(tag):
+    # 去掉命名空间，兼容transitional和strict两种格式
+    return tag.rsplit('}', 1)[-1]
+
+
+def column_index(cell_ref):
+    # "AB12" -> 28
+    index = 0
+    for char in cell_ref:
+        if char.isdigit():
+            break
+        index = index * 26 + (ord(char.upper()) - 64)
+    return index
+
+
+def read_text(elem):
+    # 富文本由多个<r><t>组成，<rPh>中的注音不属于单元格文本
+    parts = []
+    for child in elem:
+        name = local_name(child.tag)
+        if name == 't':
+            parts.append(child.text or '')
+        elif name == 'r':
+            parts.extend(t.text or '' for t in child if local_name(t.tag) == 't')
+    return ''.join(parts)
+
+
+def cast_number(text):
+    # 与openpyxl保持一致：包含小数点或指数时为float，否则为int
+    if '.' in text or 'E' in text or 'e' in text:
+        return float(text)
+    return int(text)
+
+
+def read_sheet_entries(archive):
+    # 从workbook.xml和它的rels中读取工作表名称和对应的xml路径，不解析任何sheet内容
+    rels_path = 'xl/_rels/workbook.xml.rels'
+    targets = {}
+    for rel in ET.fromstring(archive.read(rels_path)):
+        if rel.get('Type', '').endswith(WORKSHEET_REL_SUFFIX):
+            target = rel.get('Target')
+            # Target可以是相对xl/的路径，也可以是以/开头的绝对路径
+            path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+            targets[rel.get('Id')] = path
+
+    entries = []
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    for elem in workbook.iter():
+        if local_name(elem.tag) == 'sheet':
+            rel_id = elem.get(REL_NS) or next((v for k, v in elem.attrib.items() if local_name(k) == 'id'), None)
+            # 图表sheet等非工作表不导出，与openpyxl的worksheets保持一致
+            if rel_id in targets:
+                entries.append((elem.get('name'), targets[rel_id]))
+    return entries
+
+
+# workbookPr的date1904为真时日期序列号从1904-01-01开始计算（旧版Mac Excel创建的文件）
+def read_epoch(archive):
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    for elem in workbook:
+        if local_name(elem.tag) == 'workbookPr':
+            if elem.get('date1904', '').lower() in ('1', 'true'):
+                return MAC_EPOCH
+    return WINDOWS_EPOCH
+
+
+def read_sheet_names(file_path):
+    with zipfile.ZipFile(str(file_path)) as archive:
+        return [title for title, path in read_sheet_entries(archive)]
+
+
+class XlsxWorkbook:
+    # sheet_names不为None时只加载其中的sheet
+    def __init__(self, file_path, sheet_names=None):
+        self.file_path = str(file_path)
+        self.archive = zipfile.ZipFile(self.file_path)
+        self._shared_strings = None
+        self._date_styles = None
+        self._timedelta_styles = None
+        self.epoch = read_epoch(self.archive)
+        self.worksheets = [XlsxWorksheet(self, title, path) for title, path in read_sheet_entries(self.archive)
+                           if sheet_names is None or title in sheet_names]
+
+    @property
+    def sheetnames(self):
+        return [sheet.title for sheet in self.worksheets]
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            self._shared_strings = []
+            if 'xl/sharedStrings.xml' in self.archive.namelist():
+                with self.archive.open('xl/sharedStrings.xml') as file:
+                    for event, elem in ET.iterparse(file):
+                        if local_name(elem.tag) == 'si':
+                            self._shared_strings.append(read_text(elem))
+                            elem.clear()
+        return self._shared_strings
+
+    @property
+    def date_styles(self):
+        # 返回使用日期格式的单元格样式下标集合，用于把数字还原为datetime/date/time
+        if self._date_styles is None:
+            self.__read_styles()
+        return self._date_styles
+
+    @property
+    def timedelta_styles(self):
+        # 使用[h]:mm:ss等时长格式的样式，和openpyxl一样还原为timedelta
+        if self._timedelta_styles is None:
+            self.__read_styles()
+        return self._timedelta_styles
+
+    def __read_styles(self):
+        self._date_styles = set()
+        self._timedelta_styles = set()
+        if 'xl/styles.xml' not in self.archive.namelist():
+            return
+        styles = ET.fromstring(self.archive.read('xl/styles.xml'))
+        custom_formats = {}
+        cell_xfs = []
+        for elem in styles:
+            name = local_name(elem.tag)
+            if name == 'numFmts':
+                for fmt in elem:
+                    custom_formats[int(fmt.get('numFmtId'))] = fmt.get('formatCode', '')
+            elif name == 'cellXfs':
+                cell_xfs = [int(xf.get('numFmtId', 0)) for xf in elem]
+        for index, fmt_id in enumerate(cell_xfs):
+            format_code = custom_formats[fmt_id] if fmt_id in custom_formats else builtin_format_code(fmt_id)
+            if is_date_format(format_code):
+                self._date_styles.add(index)
+            if is_timedelta_format(format_code):
+                self._timedelta_styles.add(index)
+
+    def close(self):
+        self.archive.close()
+
+
+class XlsxWorksheet:
+    def __init__(self, workbook, title, path):
+        self.parent = workbook
+        self.title = title
+        self.path = path
+
+    def __cell_value(self, elem, ns):
+        cell_type = elem.get('t', 'n')
+        if cell_type == 'inlineStr':
+            inline = elem.find(ns + 'is')
+            return read_text(inline) if inline is not None else None
+
+        # 没有缓存值的公式单元格和openpyxl的data_only模式一样返回None
+        text = elem.findtext(ns + 'v')
+        if not text:
+            return None
+
+        if cell_type == 's':
+            return self.parent.shared_strings[int(text)]
+        if cell_type == 'b':
+            return text == '1'
+        if cell_type in ('str', 'e'):
+            return text
+        if cell_type == 'd':
+            return from_ISO8601(text)
+        value = cast_number(text)
+        style = elem.get('s')
+        if style is not None and int(style) in self.parent.date_styles:
+            style = int(style)
+            try:
+                return from_excel(value, self.parent.epoch, timedelta=style in self.parent.timedelta_styles)
+            except (OverflowError, ValueError):
+                # 和openpyxl一样，超出日期范围的序列号作为错误值
+                return "#VALUE!"
+        return value
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        # 只支持values_only，行之间的空行会补成空元组，保证行号与Excel一致
+        width = 0
+        current_row = 0
+        sheet_data = None
+        ns = ''
+        column_cache = {}
+        with self.parent.archive.open(self.path) as file:
+            for event, elem in ET.iterparse(file, events=('start', 'end')):
+                if event == 'start':
+                    # 根节点的命名空间只取一次，之后直接比较完整的tag，避免逐个元素拆分命名空间
+                    if sheet_data is None:
+                        if not ns and elem.tag.startswith('{'):
+                            ns = elem.tag[:elem.tag.index('}') + 1]
+                        if elem.tag == ns + 'sheetData':
+                            sheet_data = elem
+                    continue
+
+                tag = elem.tag
+                if tag == ns + 'row':
+                    row_index = int(elem.get('r', current_row + 1))
+                    values = {}
+                    col = 0
+                    for cell in elem:
+                        if cell.tag != ns + 'c':
+                            continue
+                        ref = cell.get('r')
+                        if ref:
+                            letters = ref.rstrip('0123456789')
+                            col = column_cache.get(letters)
+                            if col is None:
+                                col = column_cache[letters] = column_index(letters)
+                        else:
+                            col += 1
+                        value = self.__cell_value(cell, ns)
+                        if value is not None:
+                            values[col] = value
+                    # 解析完的行从sheetData中移除，内存占用与行数无关
+                    sheet_data.clear()
+
+                    if max_row is not None and row_index > max_row:
+                        break
+                    row_width = max(width, max(values, default=0))
+                    if max_col is not None:
+                        row_width = max_col
+                    for empty_row in range(current_row + 1, row_index):
+                        if empty_row >= min_row:
+                            yield (None,) * (width if max_col is None else max_col)
+                    current_row = row_index
+                    if row_index >= min_row:
+                        yield tuple(values.get(i) for i in range(1, row_width + 1))
+                elif tag == ns + 'dimension':
+                    ref = elem.get('ref', '')
+                    width = column_index(ref.split(':')[-1]) if ref else 0
+
+
+def load_workbook(file_path, sheet_names=None):
+    return XlsxWorkbook(file_path, sheet_names)
+
+
+# 读取每个工作表<dimension>中记录的(行数, 列数)，只解析到sheetData之前，没有记录时不返回该表
+def read_sheet_dimensions(file_path):
+    dimensions = {}
+    with zipfile.ZipFile(str(file_path)) as archive:
+        for title, path in read_sheet_entries(archive):
+            with archive.open(path) as file:
+                for event, elem in ET.iterparse(file, events=('start',)):
+                    name = local_name(elem.tag)
+                    if name == 'dimension':
+                        ref = elem.get('ref', '').split(':')[-1]
+                        row_text = ref.lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')
+                        if row_text.isdigit():
+                            dimensions[title] = (int(row_text), column_index(ref))
+                        break
+                    if name == 'sheetData':
+                        break
+    return dimensions
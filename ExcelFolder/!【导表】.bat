@@ -6,6 +6,10 @@ set output_client_folder=D:\Excel2JsonTool\GameClientFolder\Json
 set csfile_output_folder=D:\Excel2JsonTool\ProjectFolder\ConfigData\AutoGeneratedScript
 set enum_output_folder=D:\Excel2JsonTool\ProjectFolder\ConfigData\AutoGeneratedEnum
 
-REM 运行python脚本
-E:\Python3.10\python ..\ExcelExportTool\main.py %input_folder% %output_project_folder% %output_client_folder% %csfile_output_folder% %enum_output_folder%
+REM 运行python脚本，把Excel文件拖拽到bat上时只导出这些文件
+if "%~1"=="" (
+    E:\Python3.10\python ..\ExcelExportTool\main.py %input_folder% %output_project_folder% %output_client_folder% %csfile_output_folder% %enum_output_folder%
+) else (
+    E:\Python3.10\python ..\ExcelExportTool\main.py %input_folder% %output_project_folder% %output_client_folder% %csfile_output_folder% %enum_output_folder% --files %*
+)
 pause
@@ -0,0 +1,12 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 导表工具的模块直接以文件名导入（和main.py的运行方式一致）
+
+import os
+import sys
+
+TOOL_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ExcelExportTool")
+sys.path.insert(0, TOOL_FOLDER)
@@ -0,0 +1,40 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# csv中bool列的文本按布尔值读取；Excel中的文本单元格仍按原来的规则转换
+
+from csv_reader import load_workbook
+from data_processing import convert_to_type
+
+CSV_CONTENT = "\n".join([
+    "备注,,",
+    "字段说明,主键,开关",
+    "Type,int,bool",
+    "Label,required,optional",
+    "DataName,id,enabled",
+    "Default,,",
+    ",1,TRUE",
+    ",2,FALSE",
+    ",3,0",
+    ",4,",
+    ",5,yes",
+])
+
+
+def test_csv_bool_texts(tmp_path):
+    file_path = tmp_path / "Switch.csv"
+    file_path.write_text(CSV_CONTENT, encoding='utf-8')
+    rows = list(load_workbook(file_path).worksheets[0].iter_rows(values_only=True))
+    assert rows[2] == ("Type", "int", "bool")
+    values = [convert_to_type("bool", row[2]) for row in rows[6:]]
+    assert values == [True, False, False, False, True]
+
+
+def test_xlsx_text_bool_unchanged():
+    # Excel中bool列填写的文本和以前一样按bool(文本)转换
+    assert convert_to_type("bool", "yes") is True
+    assert convert_to_type("bool", "是") is True
+    assert convert_to_type("bool", False) is False
+    assert convert_to_type("bool", None) is False
@@ -0,0 +1,115 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 输入目录镜像：模拟网络共享盘上很慢的stat和复制，没有改动的文件不能再复制，只改了修改时间的文件只计算哈希
+
+import os
+import time
+
+import pytest
+
+import input_cache
+from input_cache import mirror_source_folder
+
+# 每次访问共享盘的延迟
+LATENCY = 0.005
+
+
+@pytest.fixture
+def slow_share(monkeypatch):
+    calls = {"stat": 0, "copy": 0, "hash": 0}
+    stat = os.stat
+    copy2 = input_cache.shutil.copy2
+    file_hash = input_cache.file_hash
+
+    def slow_stat(path, *args, **kwargs):
+        calls["stat"] += 1
+        time.sleep(LATENCY)
+        return stat(path, *args, **kwargs)
+
+    def slow_copy(source_path, cache_path):
+        calls["copy"] += 1
+        time.sleep(LATENCY)
+        return copy2(source_path, cache_path)
+
+    def counted_hash(file_path):
+        calls["hash"] += 1
+        return file_hash(file_path)
+
+    monkeypatch.setattr(input_cache.os, "stat", slow_stat)
+    monkeypatch.setattr(input_cache.shutil, "copy2", slow_copy)
+    monkeypatch.setattr(input_cache, "file_hash", counted_hash)
+    return calls
+
+
+def write_file(file_path, content):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'wb') as file:
+        file.write(content)
+
+
+def create_source_folder(source_folder):
+    write_file(os.path.join(source_folder, "Item.xlsx"), b"item")
+    write_file(os.path.join(source_folder, "Skill.csv"), b"id,name")
+    write_file(os.path.join(source_folder, "Sub", "Drop_01.xlsx"), b"drop")
+    # Excel的锁文件和其他文件不同步
+    write_file(os.path.join(source_folder, "~$Item.xlsx"), b"lock")
+    write_file(os.path.join(source_folder, "readme.txt"), b"text")
+
+
+def mirror(source_folder, cache_folder, calls):
+    for name in calls:
+        calls[name] = 0
+    return mirror_source_folder(str(source_folder), str(cache_folder))
+
+
+def test_second_run_copies_nothing(tmp_path, slow_share):
+    source_folder, cache_folder = tmp_path / "share", tmp_path / "cache"
+    create_source_folder(source_folder)
+
+    assert mirror(source_folder, cache_folder, slow_share) == (3, 0, 0)
+    assert slow_share["copy"] == 3
+    assert not os.path.exists(cache_folder / "~$Item.xlsx")
+    assert not os.path.exists(cache_folder / "readme.txt")
+
+    assert mirror(source_folder, cache_folder, slow_share) == (0, 3, 0)
+    assert slow_share["copy"] == 0
+    assert slow_share["hash"] == 0
+
+
+def test_touch_hashes_without_copy(tmp_path, slow_share):
+    source_folder, cache_folder = tmp_path / "share", tmp_path / "cache"
+    create_source_folder(source_folder)
+    mirror(source_folder, cache_folder, slow_share)
+
+    source_path = source_folder / "Item.xlsx"
+    source_stat = os.stat(source_path)
+    os.utime(source_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns + 10 ** 9))
+    assert mirror(source_folder, cache_folder, slow_share) == (0, 3, 0)
+    assert slow_share["copy"] == 0
+    # 源文件和本地副本各计算一次
+    assert slow_share["hash"] == 2
+    assert os.stat(cache_folder / "Item.xlsx").st_mtime_ns == os.stat(source_path).st_mtime_ns
+
+    # 修改时间已经同步，下次不再计算哈希
+    assert mirror(source_folder, cache_folder, slow_share) == (0, 3, 0)
+    assert slow_share["hash"] == 0
+
+
+def test_changed_and_removed_files(tmp_path, slow_share):
+    source_folder, cache_folder = tmp_path / "share", tmp_path / "cache"
+    create_source_folder(source_folder)
+    mirror(source_folder, cache_folder, slow_share)
+
+    # 大小相同、内容不同
+    source_path = source_folder / "Item.xlsx"
+    source_stat = os.stat(source_path)
+    write_file(str(source_path), b"ITEM")
+    os.utime(source_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns + 10 ** 9))
+    os.remove(source_folder / "Sub" / "Drop_01.xlsx")
+    assert mirror(source_folder, cache_folder, slow_share) == (1, 1, 1)
+    assert slow_share["copy"] == 1
+    assert (cache_folder / "Item.xlsx").read_bytes() == b"ITEM"
+    assert not os.path.exists(cache_folder / "Sub" / "Drop_01.xlsx")
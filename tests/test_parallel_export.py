@@ -0,0 +1,105 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 并行导表的一致性：多进程导出的所有文件与串行导表逐字节相同
+
+import os
+import shutil
+
+import openpyxl
+import pytest
+
+from worker_pool import shutdown_worker_pool
+from worksheet_data import ROW_CHUNK_SIZE
+from parallel_export import has_chunked_sheet
+from test_xlsx_reader import SAMPLE_FOLDER, create_table_workbook, export_folder
+
+
+# 拆分表的一个分表，主键从first_id开始
+def create_split_part(file_path, first_id):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Part"
+    ws.append(["备注", None, None])
+    ws.append(["字段说明", "主键", "数值"])
+    ws.append(["Type", "int", "int"])
+    ws.append(["Label", "required", "optional"])
+    ws.append(["DataName", "id", "value"])
+    ws.append(["Default", None, 0])
+    for key in range(first_id, first_id + 20):
+        ws.append([None, key, key * 3])
+    wb.save(file_path)
+
+
+# 行数超过分块大小的表，jobs大于1时按行分块转换
+def create_big_workbook(file_path, row_count):
+    # 不使用write_only模式，它不写入工作表尺寸，无法提前判断是大表
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Big"
+    ws.append(["备注", None, None, None])
+    ws.append(["字段说明", "主键", "名字", "数值"])
+    ws.append(["Type", "int", "string", "float"])
+    ws.append(["Label", "required", "optional", "optional"])
+    ws.append(["DataName", "id", "name", "value"])
+    ws.append(["Default", None, None, 0.5])
+    for key in range(1, row_count + 1):
+        ws.append([None, key, f"名字{key}", key / 8 if key % 7 else None])
+    wb.save(file_path)
+
+
+@pytest.fixture(scope="module")
+def source_folder(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("excel")
+    for filename in os.listdir(SAMPLE_FOLDER):
+        if filename.endswith(".xlsx"):
+            shutil.copy(os.path.join(SAMPLE_FOLDER, filename), folder)
+    create_table_workbook(str(folder / "Golden.xlsx"))
+    create_split_part(str(folder / "Part_01.xlsx"), 1)
+    create_split_part(str(folder / "Part_02.xlsx"), 101)
+    return folder
+
+
+@pytest.fixture(scope="module")
+def golden(source_folder, tmp_path_factory):
+    outputs = export_folder(str(source_folder), tmp_path_factory.mktemp("serial"))
+    assert ("project", "GoldenConfig.json") in outputs
+    assert ("project", "PartConfig.json") in outputs
+    return outputs
+
+
+# 进程池是模块级的，每个测试结束后关闭，不影响其他测试
+@pytest.fixture(autouse=True)
+def close_worker_pool():
+    yield
+    shutdown_worker_pool()
+
+
+def test_jobs_export_matches_serial(source_folder, golden, tmp_path):
+    assert export_folder(str(source_folder), tmp_path / "jobs", jobs=3) == golden
+
+
+# 大表在主进程中导出、分块交给进程池，其他文件同时在子进程中导出；只有一个文件时同样分块
+def test_chunked_export_matches_serial(source_folder, tmp_path):
+    big_folder = tmp_path / "excel"
+    shutil.copytree(source_folder, big_folder)
+    big_file = str(big_folder / "Big.xlsx")
+    create_big_workbook(big_file, ROW_CHUNK_SIZE + 500)
+    assert has_chunked_sheet(big_file, ["Big"])
+
+    serial = export_folder(str(big_folder), tmp_path / "serial")
+    assert export_folder(str(big_folder), tmp_path / "jobs", jobs=2) == serial
+
+    single_folder = tmp_path / "single"
+    single_folder.mkdir()
+    shutil.copy(big_file, single_folder)
+    single = export_folder(str(single_folder), tmp_path / "single_jobs", jobs=2)
+    assert single[("project", "BigConfig.json")] == serial[("project", "BigConfig.json")]
+
+
+# 多机导表：本机启动两个工作节点连接协调节点，端口由系统分配
+def test_distributed_export_matches_serial(source_folder, golden, tmp_path):
+    outputs = export_folder(str(source_folder), tmp_path / "distributed", coordinator="127.0.0.1:0", local_workers=2)
+    assert outputs == golden
@@ -0,0 +1,37 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 表结构指纹：表结构相同但c#文件被其他导表（--no-cache、多机导表）改写过时要重新生成
+
+from schema_fingerprint import SchemaFingerprints
+
+SCHEMA = [["备注"], ["主键"], ["int"], ["required"], ["id"], False]
+
+
+def write_text(file_path, content):
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def test_unchanged_schema_and_file(tmp_path):
+    fingerprints = SchemaFingerprints(str(tmp_path / "state"), "v1")
+    file_path = str(tmp_path / "ItemData.cs")
+    write_text(file_path, "class ItemData {}")
+    fingerprints.record(file_path, SCHEMA)
+    assert fingerprints.is_unchanged(file_path, SCHEMA)
+    assert not fingerprints.is_unchanged(file_path, SCHEMA[:-1] + [True])
+    assert not SchemaFingerprints(str(tmp_path / "state"), "v2").is_unchanged(file_path, SCHEMA)
+
+
+def test_rewritten_or_missing_file(tmp_path):
+    fingerprints = SchemaFingerprints(str(tmp_path / "state"), "v1")
+    file_path = str(tmp_path / "ItemData.cs")
+    write_text(file_path, "class ItemData { int items; }")
+    fingerprints.record(file_path, SCHEMA)
+    # 没有记录指纹的导表按另一个表结构改写了文件
+    write_text(file_path, "class ItemData { int itemList; }")
+    assert not fingerprints.is_unchanged(file_path, SCHEMA)
+    (tmp_path / "ItemData.cs").unlink()
+    assert not fingerprints.is_unchanged(file_path, SCHEMA)
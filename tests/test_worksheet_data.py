@@ -0,0 +1,65 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# 主键为空但有数据的行：无论后面是否还有数据行，三种读取方式都要退出导表
+
+import openpyxl
+import pytest
+
+from build_context import BuildContext
+from excel_processing import load_workbook
+from worksheet_data import WorksheetData
+
+READ_MODES = [("openpyxl", False), ("openpyxl", True), ("native", False)]
+
+
+def create_workbook(file_path, data_rows):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Ph"
+    ws.append(["备注", None, None])
+    ws.append(["字段说明", "主键", "值"])
+    ws.append(["Type", "int", "int"])
+    ws.append(["Label", "required", "optional"])
+    ws.append(["DataName", "id", "v"])
+    ws.append(["Default", None, None])
+    for row in data_rows:
+        ws.append(row)
+    # 整列设置格式产生的空行不算数据
+    for row_index in range(len(data_rows) + 7, len(data_rows) + 20):
+        ws.cell(row=row_index, column=3).number_format = "0.00"
+    wb.save(file_path)
+
+
+def read_rows(file_path, engine, streaming):
+    wb = load_workbook(file_path, streaming, engine)
+    context = BuildContext(("p", "c", "cs", "enum"), streaming, engine)
+    try:
+        return [tuple(row) for row in WorksheetData(wb.worksheets[0], context).row_data]
+    finally:
+        wb.close()
+
+
+@pytest.mark.parametrize("engine, streaming", READ_MODES)
+def test_rows_without_key_are_skipped_when_empty(tmp_path, engine, streaming):
+    file_path = str(tmp_path / "Ph.xlsx")
+    create_workbook(file_path, [[None, 1, 10], [None, None, None], ["策划备注", None, None], [None, 2, 20]])
+    assert read_rows(file_path, engine, streaming) == [(1, 10), (2, 20)]
+
+
+@pytest.mark.parametrize("engine, streaming", READ_MODES)
+def test_row_without_key_before_data_stops_export(tmp_path, engine, streaming):
+    file_path = str(tmp_path / "Ph.xlsx")
+    create_workbook(file_path, [[None, 1, 10], [None, None, 999], [None, 2, 20]])
+    with pytest.raises(SystemExit):
+        read_rows(file_path, engine, streaming)
+
+
+@pytest.mark.parametrize("engine, streaming", READ_MODES)
+def test_trailing_row_without_key_stops_export(tmp_path, engine, streaming):
+    file_path = str(tmp_path / "Ph.xlsx")
+    create_workbook(file_path, [[None, 1, 10], [None, 2, 20], [None, None, 999]])
+    with pytest.raises(SystemExit):
+        read_rows(file_path, engine, streaming)
@@ -0,0 +1,148 @@
+# Author: huhongwei 306463233@qq.com
+# Created: 2024-09-10
+# MIT License
+# All rights reserved
+
+# native引擎与openpyxl的一致性：逐个单元格比较读取到的值，再比较完整导表生成的所有文件
+
+import os
+import re
+import shutil
+import zipfile
+import datetime
+
+import openpyxl
+from openpyxl.utils.datetime import MAC_EPOCH
+
+import xlsx_reader
+from build_context import BuildContext
+from main import batch_excel_to_json
+
+SAMPLE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ExcelFolder")
+
+
+def read_with_openpyxl(file_path):
+    wb = openpyxl.load_workbook(file_path, data_only=True)
+    values = {ws.title: [tuple(row) for row in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+    wb.close()
+    return values
+
+
+def read_with_native(file_path):
+    wb = xlsx_reader.load_workbook(file_path)
+    values = {ws.title: [tuple(row) for row in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+    wb.close()
+    return values
+
+
+# openpyxl不会保存公式的计算结果，这里手动写入缓存值，模拟Excel保存过的文件
+def set_cached_formula_values(file_path, cached_values):
+    temp_path = file_path + ".tmp"
+    with zipfile.ZipFile(file_path) as source, zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename.startswith('xl/worksheets/sheet'):
+                text = data.decode('utf-8')
+                for ref, value in cached_values.items():
+                    text = re.sub(rf'(<c r="{ref}"[^>]*><f>[^<]*</f>)<v\s*/>', rf'\g<1><v>{value}</v>', text)
+                data = text.encode('utf-8')
+            target.writestr(item, data)
+    os.replace(temp_path, file_path)
+
+
+def create_value_workbook(file_path, date1904=False):
+    wb = openpyxl.Workbook()
+    if date1904:
+        wb.epoch = MAC_EPOCH
+    ws = wb.active
+    ws.title = "Values"
+    ws.append(["文本", 1, 2.5, True, False, None, "  空格  ", "多行\n文本"])
+    ws.append([datetime.datetime(2024, 9, 10, 8, 30), datetime.date(2024, 2, 29), datetime.time(12, 30),
+               datetime.datetime(1900, 1, 15), datetime.datetime(1900, 2, 28), datetime.datetime(1900, 3, 1),
+               datetime.timedelta(hours=30, minutes=15)])
+    ws.append([-7, 1e20, 0.1, 123456789012, "=1+1", "=A1&\"x\""])
+    ws["C4"] = 0.75
+    ws["C4"].number_format = "hh:mm"
+    ws["D4"] = 45000
+    ws["D4"].number_format = "yyyy\"年\"m\"月\"d\"日\""
+    ws["E4"] = 45000
+    ws["E4"].number_format = "0.00"
+    other = wb.create_sheet("Sparse")
+    other["C3"] = "c3"
+    other["A6"] = 6
+    wb.save(file_path)
+    set_cached_formula_values(file_path, {"E3": "2"})
+
+
+def test_native_values_match_openpyxl(tmp_path):
+    file_path = str(tmp_path / "Values.xlsx")
+    create_value_workbook(file_path)
+    assert read_with_native(file_path) == read_with_openpyxl(file_path)
+
+
+def test_native_time_and_early_dates(tmp_path):
+    file_path = str(tmp_path / "Values.xlsx")
+    create_value_workbook(file_path)
+    row = read_with_native(file_path)["Values"][1]
+    assert row[2] == datetime.time(12, 30)
+    assert row[3] == datetime.datetime(1900, 1, 15)
+    assert row[6] == datetime.timedelta(hours=30, minutes=15)
+
+
+def test_native_date1904_matches_openpyxl(tmp_path):
+    file_path = str(tmp_path / "Values1904.xlsx")
+    create_value_workbook(file_path, date1904=True)
+    values = read_with_native(file_path)
+    assert values == read_with_openpyxl(file_path)
+    assert values["Values"][1][0] == datetime.datetime(2024, 9, 10, 8, 30)
+
+
+def create_table_workbook(file_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Golden"
+    ws.append(["备注", None, "说明", None, None, None, None])
+    ws.append(["字段说明", "主键", "名字", "数值", "开关", "列表", "字典"])
+    ws.append(["Type", "int", "string", "float", "bool", "list(int)", "dict(string,int)"])
+    ws.append(["Label", "required", "optional", "optional", "optional", "optional", "optional"])
+    ws.append(["DataName", "id", "name", "value", "enabled", "items", "attrs"])
+    ws.append(["Default", None, None, 1.5, None, None, None])
+    for index in range(1, 51):
+        ws.append([None, index, f"名字{index}", index / 4, index % 2 == 0, f"{index},{index + 1}", f"hp:{index}\nmp:{index * 2}"])
+    enum_sheet = wb.create_sheet("Enum-GoldenType")
+    enum_sheet.append(["名字", "值", "说明"])
+    for index, name in enumerate(["None", "Small", "Large"]):
+        enum_sheet.append([name, index, f"说明{index}"])
+    wb.save(file_path)
+
+
+# options为BuildContext的其他参数，例如jobs、coordinator、local_workers
+def export_folder(source_folder, output_root, engine="openpyxl", streaming=False, **options):
+    output_folders = [str(output_root / name) for name in ("project", "client", "cs", "enum")]
+    for output_folder in output_folders:
+        os.makedirs(output_folder)
+    context = BuildContext(output_folders, streaming, engine, state_folder=str(output_root / "state"), use_cache=False, **options)
+    batch_excel_to_json(context, source_folder)
+    outputs = {}
+    for output_folder in output_folders:
+        for filename in sorted(os.listdir(output_folder)):
+            with open(os.path.join(output_folder, filename), 'rb') as file:
+                outputs[(os.path.basename(output_folder), filename)] = file.read()
+    return outputs
+
+
+# 黄金输出：示例表和覆盖各种类型的表，两个引擎（完整和流式模式）生成的所有文件逐字节相同
+def test_native_export_matches_openpyxl(tmp_path):
+    source_folder = tmp_path / "excel"
+    source_folder.mkdir()
+    for filename in os.listdir(SAMPLE_FOLDER):
+        if filename.endswith(".xlsx"):
+            shutil.copy(os.path.join(SAMPLE_FOLDER, filename), source_folder)
+    create_table_workbook(str(source_folder / "Golden.xlsx"))
+
+    golden = export_folder(str(source_folder), tmp_path / "openpyxl", "openpyxl", False)
+    assert ("project", "GoldenConfig.json") in golden
+    assert ("enum", "GoldenType.cs") in golden
+    for streaming in (False, True):
+        outputs = export_folder(str(source_folder), tmp_path / f"native{int(streaming)}", "native", streaming)
+        assert outputs == golden